@@ -1,16 +1,26 @@
 import curses
-import urllib.request
+import atexit
 import urllib.parse
 import json
 import os
 import sys
 import struct
 import threading
-import ssl
+import queue
+import select
+import random
 import time
 import re
 import unicodedata
-from html.parser import HTMLParser
+import fnmatch
+import heapq
+import codecs
+import mmap
+import zlib
+import hashlib
+from array import array
+# ssl, http.client and html.parser are imported on first use: a launch that
+# only shows cached lists never needs them
 
 # --- PROJECT SETTINGS ---
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,7 +28,26 @@ LOG_FILE = os.path.join(PROJECT_DIR, "app.log")
 CONFIG_FILE = os.path.join(PROJECT_DIR, "controls.json")
 KEYS_FILE = os.path.join(PROJECT_DIR, "keys.txt")
 COLLECTIONS_FILE = os.path.join(PROJECT_DIR, "collections.json")
+SETTINGS_FILE = os.path.join(PROJECT_DIR, "settings.json")
 CACHE_DIR = os.path.join(PROJECT_DIR, "cache")
+LRU_FILE = os.path.join(CACHE_DIR, "lru.json")
+QUEUE_FILE = os.path.join(PROJECT_DIR, "queue.json")
+PARTS_FILE = os.path.join(PROJECT_DIR, "partials.json")
+SYNC_FILE = os.path.join(PROJECT_DIR, "sync.json")
+SESSION_FILE = os.path.join(PROJECT_DIR, "session.json")
+NODES_FILE = os.path.join(PROJECT_DIR, "mirrors.json")
+DEFAULT_TTL_HOURS = 24
+SEGMENT_MIN_SIZE = 32 * 1024 * 1024
+SEGMENT_MIN_SPLIT = 2 * 1024 * 1024
+SEGMENT_BLOCK = 256 * 1024
+BLOCK_MIN, BLOCK_MAX = 16 * 1024, 1024 * 1024
+PROGRESS_FPS = 4
+WRITE_BLOCK = 1024 * 1024   # bytes per write to the card
+WRITE_BUFFERS = 4           # blocks a download may have waiting for the card
+FSYNC_EVERY = 32 * 1024 * 1024
+RATE_STEPS = [0, 128, 256, 512, 1024, 2048, 4096, 8192]  # KB/s, 0 = no limit
+DOWNLOAD_WORKERS = 2
+UI_RETRIES = 0  # list fetches a popup is waiting on fail at once; background work keeps the pool's retries
 
 if not os.path.exists(CACHE_DIR): os.makedirs(CACHE_DIR)
 
@@ -28,6 +57,10 @@ if not os.path.exists(CACHE_DIR): os.makedirs(CACHE_DIR)
 STORAGE_ROOT = "/roms"
 if not os.path.exists(STORAGE_ROOT): STORAGE_ROOT = "."
 
+# --- ARCHIVE ENDPOINT ---
+# Overridable so the benchmark suite can point the app at a local stand-in server.
+ARCHIVE_URL = os.environ.get("ARCHIVE_URL", "https://archive.org").rstrip("/")
+
 # --- HEADERS ---
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
@@ -44,22 +77,60 @@ except: pass
 COLLECTIONS = []
 
 # --- UTILS ---
-class LinkParser(HTMLParser):
-    def __init__(self, target_ext):
-        super().__init__()
-        self.links = []
-        self.target_ext = target_ext.lower()
-    def handle_starttag(self, tag, attrs):
-        if tag == 'a':
-            for attr in attrs:
-                if attr[0] == 'href':
-                    raw = attr[1]
-                    if raw.startswith('//'): raw = 'https:' + raw
-                    if 'sort=' in raw: continue
-                    decoded = urllib.parse.unquote(raw)
-                    lower = decoded.lower()
-                    if lower.endswith(self.target_ext) or lower.endswith('.zip') or lower.endswith('.7z'):
-                        self.links.append({'name': raw, 'size': None})
+LISTING_SIZE = re.compile(r'(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?$', re.I)
+LISTING_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+def parse_listing_size(text):
+    # "1.2M", "345K", "12345" -> bytes; dates, names and "-" -> None
+    m = LISTING_SIZE.match(text)
+    if not m: return None
+    return int(float(m.group(1)) * LISTING_UNITS[m.group(2).upper()])
+
+def listing_link(raw, ext):
+    # -> the href to keep, or None for sort links, parents and other file types
+    if raw.startswith('//'): raw = 'https:' + raw
+    if 'sort=' in raw: return None
+    lower = raw.lower()
+    if '%' in lower: lower = urllib.parse.unquote(lower)
+    return raw if lower.endswith((ext, '.zip', '.7z')) else None
+
+LinkParser = None
+
+def link_parser(target_ext):
+    global LinkParser
+    if LinkParser is None:
+        from html.parser import HTMLParser
+
+        class LinkParser(HTMLParser):
+            # Any listing page that is not archive.org's table layout. A size found
+            # in a later cell of a link's table row is kept with the link.
+            def __init__(self, target_ext):
+                super().__init__()
+                self.links = []
+                self.target_ext = target_ext.lower()
+                self.row_link = None
+                self.cell = None
+            def handle_starttag(self, tag, attrs):
+                if tag == 'a':
+                    for k, v in attrs:
+                        if k == 'href' and v:
+                            name = listing_link(v, self.target_ext)
+                            if name is not None:
+                                self.row_link = {'name': name, 'size': None}
+                                self.links.append(self.row_link)
+                            break
+                elif tag == 'td': self.cell = []
+                elif tag == 'tr': self.row_link = None
+            def handle_data(self, data):
+                if self.cell is not None: self.cell.append(data)
+            def handle_endtag(self, tag):
+                if tag == 'td' and self.cell is not None:
+                    if self.row_link is not None:
+                        size = parse_listing_size("".join(self.cell).strip())
+                        if size is not None: self.row_link['size'] = size
+                    self.cell = None
+    return LinkParser(target_ext)
+
 
 def safe_str(text):
     try:
@@ -78,15 +149,12 @@ def format_size(size_bytes):
         return f"{int(s)}B"
     except: return "0B"
 
-def get_cache_path(sys_name):
+def get_cache_path(sys_name, suffix=".json"):
     safe = re.sub(r'[^a-zA-Z0-9]', '_', sys_name)
-    return os.path.join(CACHE_DIR, f"{safe}.json")
+    return os.path.join(CACHE_DIR, f"{safe}{suffix}")
 
-def log(msg):
-    try:
-        with open(LOG_FILE, "a") as f:
-            f.write(f"[{time.strftime('%H:%M:%S')}] {msg}\n")
-    except: pass
+def get_meta_path(sys_name):
+    return get_cache_path(sys_name, ".meta.json")
 
 def safe_addstr(win, y, x, text, color_pair_id):
     try:
@@ -99,8 +167,122 @@ def safe_addstr(win, y, x, text, color_pair_id):
         win.attroff(curses.color_pair(color_pair_id))
     except curses.error: pass
 
+# --- LOGGING & PROFILING ---
+class LogWriter:
+    # log() only appends to a list; a background thread writes the lines out
+    # in batches, so the UI and download threads never wait on the SD card.
+    def __init__(self, interval=1.0, max_pending=5000):
+        self.interval, self.max_pending = interval, max_pending
+        self.pending = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.io_lock = threading.Lock()
+        self.thread = None
+
+    def write(self, line):
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending.append(line)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                lines, self.pending = self.pending, []
+                dropped, self.dropped = self.dropped, 0
+            if dropped: lines.append(f"[{time.strftime('%H:%M:%S')}] Log: {dropped} lines dropped\n")
+            if not lines: return
+            try:
+                with open(LOG_FILE, "a") as f: f.write("".join(lines))
+            except: pass
+
+    def reset(self, first_line):
+        with self.io_lock:
+            with self.lock: self.pending, self.dropped = [], 0
+            try:
+                with open(LOG_FILE, "w") as f: f.write(first_line + "\n")
+            except: pass
+
+LOGGER = LogWriter()
+atexit.register(LOGGER.flush)
+
+def log(msg):
+    LOGGER.write(f"[{time.strftime('%H:%M:%S')}] {msg}\n")
+
+class Span:
+    __slots__ = ('prof', 'name', 't0')
+
+    def __init__(self, prof, name): self.prof, self.name = prof, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc): self.prof.add(self.name, time.perf_counter() - self.t0)
+
+class Profiler:
+    # Timing spans (count, total, max, last) and counters for the hot paths,
+    # cheap enough to stay on. They feed the START+Y stats overlay and a
+    # summary line in app.log at exit; "profile_log" also logs every span.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.log_spans = False
+
+    def add(self, name, seconds):
+        with self.lock:
+            st = self.spans.get(name)
+            if st is None: st = self.spans[name] = [0, 0.0, 0.0, 0.0]
+            st[0] += 1
+            st[1] += seconds
+            if seconds > st[2]: st[2] = seconds
+            st[3] = seconds
+        if self.log_spans: log(f"SPAN {name} {seconds*1000:.1f}ms")
+
+    def count(self, name, n=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def span(self, name): return Span(self, name)
+
+    def snapshot(self):
+        with self.lock: return {k: list(v) for k, v in self.spans.items()}, dict(self.counters)
+
+    def summary(self):
+        spans, counters = self.snapshot()
+        parts = [f"{k}={v[0]}x/{1000*v[1]/v[0]:.1f}ms/max{1000*v[2]:.1f}ms" for k, v in sorted(spans.items())]
+        return " ".join(parts + [f"{k}={v}" for k, v in sorted(counters.items())])
+
+PROFILE = Profiler()
+
 # --- LOADER ---
-def load_collections(stdscr):
+SETTINGS = {
+    'prefetch_on_start': False,
+    'refresh_concurrency': 3,
+    'profile_log': False,
+    'download_limit': 0,
+    'cache_max_mb': 64,
+    'cache_compress': False
+}
+
+def load_settings():
+    if not os.path.exists(SETTINGS_FILE): return
+    try:
+        with open(SETTINGS_FILE, "r") as f: SETTINGS.update(json.load(f))
+    except Exception as e: log(f"Settings load failed: {e}")
+    PROFILE.log_spans = bool(SETTINGS['profile_log'])
+    LIMITER.set_rate(max(0, int(SETTINGS['download_limit'])) * 1024)
+
+def read_collections():
     global COLLECTIONS
     if os.path.exists(COLLECTIONS_FILE):
         try:
@@ -114,11 +296,18 @@ def load_collections(stdscr):
                         s.get('url', ''),
                         s.get('filter', ''),
                         s.get('folder', 'roms'),
-                        s.get('extension', '.zip')
+                        s.get('extension', '.zip'),
+                        int(s.get('segments', 0) or 0),
+                        int(float(s.get('ttl', DEFAULT_TTL_HOURS)) * 3600),
+                        bool(s.get('extract', False))
                     ))
                 if not COLLECTIONS: raise ValueError("Empty List")
                 return True
         except: pass
+    return False
+
+def load_collections(stdscr):
+    if read_collections(): return True
     
     h, w = stdscr.getmaxyx()
     stdscr.clear()
@@ -148,6 +337,9 @@ input_state = {
     'UP': False, 'DOWN': False, 'LEFT': False, 'RIGHT': False 
 }
 BTN_MAP = {} 
+input_events = queue.Queue()
+REPEAT_KEYS = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+REPEAT_DELAY, REPEAT_RATE = 0.35, 0.1
 
 def load_controls():
     global BTN_MAP
@@ -166,19 +358,48 @@ def save_controls():
             json.dump(BTN_MAP, f)
     except: pass
 
+def push_event(kind, key):
+    input_events.put((kind, key))
+
+def next_event(timeout=None):
+    try: return input_events.get(timeout=timeout)
+    except queue.Empty: return None
+
+def set_button(key, pressed, held):
+    if input_state.get(key) == pressed: return
+    input_state[key] = pressed
+    push_event('press' if pressed else 'release', key)
+    if key in REPEAT_KEYS:
+        if pressed: held[key] = time.time() + REPEAT_DELAY
+        else: held.pop(key, None)
+
 def input_worker():
-    try: js_dev = open("/dev/input/js0", "rb")
+    try: js_dev = open("/dev/input/js0", "rb", buffering=0)
     except: return
+    held = {}
     while True:
-        ev = js_dev.read(8)
-        if ev:
-            _, v, t, n = struct.unpack('IhBB', ev)
-            if t == 1:
-                is_pressed = (v == 1)
-                if n in BTN_MAP: input_state[BTN_MAP[n]] = is_pressed
-            elif t == 2:
-                if n == 1: input_state['UP'], input_state['DOWN'] = (v < -20000), (v > 20000)
-                elif n == 0: input_state['LEFT'], input_state['RIGHT'] = (v < -20000), (v > 20000)
+        timeout = max(0, min(held.values()) - time.time()) if held else None
+        ready, _, _ = select.select([js_dev], [], [], timeout)
+        if ready:
+            data = js_dev.read(8 * 16)
+            if not data: return
+            for off in range(0, len(data) - 7, 8):
+                _, v, t, n = struct.unpack('IhBB', data[off:off+8])
+                if t == 1:
+                    if n in BTN_MAP: set_button(BTN_MAP[n], v == 1, held)
+                elif t == 2:
+                    if n == 1:
+                        set_button('UP', v < -20000, held)
+                        set_button('DOWN', v > 20000, held)
+                    elif n == 0:
+                        set_button('LEFT', v < -20000, held)
+                        set_button('RIGHT', v > 20000, held)
+        # key repeat for held directions lives here, not in the UI loops
+        now = time.time()
+        for key, due in held.items():
+            if now >= due:
+                push_event('repeat', key)
+                held[key] = now + REPEAT_RATE
 
 # --- KEYBOARD ---
 KEYBOARD_LAYOUT = [
@@ -189,12 +410,11 @@ KEYBOARD_LAYOUT = [
     ['SPACE', 'BACK', 'DONE']
 ]
 
-def run_keyboard(stdscr, title):
-    search_term = ""
+def run_keyboard(stdscr, title, on_change=None, search_term="", backdrop=None):
+    # backdrop(draw_box) repaints whatever sits behind the keyboard, drawing it with draw_box as its overlay
     ky, kx = 1, 0
-    last_input = 0
-    while True:
-        stdscr.erase()
+    status = on_change(search_term) if on_change else ""
+    def draw_box(stdscr):
         h, w = stdscr.getmaxyx()
         box_h, box_w = 14, 50
         by, bx = (h - box_h)//2, (w - box_w)//2
@@ -206,6 +426,7 @@ def run_keyboard(stdscr, title):
             safe_addstr(stdscr, y, bx+box_w-1, "|", 3)
         safe_addstr(stdscr, by+1, bx+2, title.center(box_w-4), 3)
         safe_addstr(stdscr, by+3, bx+2, f"[{search_term}]".center(box_w-4), 3)
+        if status: safe_addstr(stdscr, by+box_h-2, bx+2, status.center(box_w-4), 1)
         
         start_y = by + 5
         for r, row in enumerate(KEYBOARD_LAYOUT):
@@ -218,160 +439,2117 @@ def run_keyboard(stdscr, title):
                 safe_addstr(stdscr, start_y + r, pos_x, f" {key_char} ", color)
         
         safe_addstr(stdscr, h-1, 0, " A:TYPE  B:DEL  START:CONFIRM ".center(w), 2)
-        stdscr.refresh()
+    while True:
+        if backdrop: backdrop(draw_box)
+        else:
+            stdscr.erase()
+            draw_box(stdscr)
+            stdscr.refresh()
         
-        now = time.time()
-        if now - last_input > 0.15:
-            if input_state['UP']: 
-                ky = max(0, ky - 1)
-                kx = min(kx, len(KEYBOARD_LAYOUT[ky])-1)
-                last_input = now
-            elif input_state['DOWN']:
-                ky = min(len(KEYBOARD_LAYOUT)-1, ky + 1)
-                kx = min(kx, len(KEYBOARD_LAYOUT[ky])-1)
-                last_input = now
-            elif input_state['LEFT']:
-                kx = max(0, kx - 1)
-                last_input = now
-            elif input_state['RIGHT']:
-                kx = min(len(KEYBOARD_LAYOUT[ky])-1, kx + 1)
-                last_input = now
-            elif input_state['A']:
-                key = KEYBOARD_LAYOUT[ky][kx]
-                if key == 'SPACE': search_term += " "
-                elif key == 'BACK': search_term = search_term[:-1]
-                elif key == 'DONE': return search_term
-                else: search_term += key
-                last_input = now + 0.1
-            elif input_state['B']:
-                search_term = search_term[:-1]
-                last_input = now + 0.1
-            elif input_state['START']: return search_term
-        curses.napms(30)
+        prev_term = search_term
+        ev = next_event(0.5 if on_change else None)
+        if ev is None:
+            if on_change: status = on_change(search_term)  # the status may change on its own (indexing)
+            continue
+        if ev[0] == 'release': continue
+        key = ev[1]
+        if key == 'UP': 
+            ky = max(0, ky - 1)
+            kx = min(kx, len(KEYBOARD_LAYOUT[ky])-1)
+        elif key == 'DOWN':
+            ky = min(len(KEYBOARD_LAYOUT)-1, ky + 1)
+            kx = min(kx, len(KEYBOARD_LAYOUT[ky])-1)
+        elif key == 'LEFT':
+            kx = max(0, kx - 1)
+        elif key == 'RIGHT':
+            kx = min(len(KEYBOARD_LAYOUT[ky])-1, kx + 1)
+        elif key == 'A':
+            key = KEYBOARD_LAYOUT[ky][kx]
+            if key == 'SPACE': search_term += " "
+            elif key == 'BACK': search_term = search_term[:-1]
+            elif key == 'DONE': return search_term
+            else: search_term += key
+        elif key == 'B':
+            search_term = search_term[:-1]
+        elif key == 'START': return search_term
+        if on_change and search_term != prev_term: status = on_change(search_term)
 
-# --- NETWORK ---
-try: ssl._create_default_https_context = ssl._create_unverified_context
-except: pass
+# --- CACHE ---
+REVALIDATING = set()
+REVALIDATE_LOCK = threading.Lock()
+
+# Binary list format (.bin): header, then one fixed-width record per entry
+# (name offset, name length, size, md5), then the packed UTF-8 names. With
+# the compressed flag, everything after the header is one zlib stream.
+# Version 1 records have no md5.
+CACHE_MAGIC = b"ABLC"
+CACHE_VERSION = 2
+CACHE_HEADER = struct.Struct('<4sBBxxI')
+CACHE_RECORD = struct.Struct('<IIQ16s')
+CACHE_RECORD_V1 = struct.Struct('<IIQ')
+CACHE_NO_SIZE = 0xFFFFFFFFFFFFFFFF
+CACHE_NO_MD5 = bytes(16)
+CACHE_FLAG_ZLIB = 1
+
+class CachedList:
+    # Read-only sequence over a .bin cache; entries are decoded only when indexed.
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count = CACHE_HEADER.unpack_from(data, 0)
+        if magic != CACHE_MAGIC or version not in (1, 2): raise ValueError("Bad cache")
+        if flags & CACHE_FLAG_ZLIB:
+            payload = zlib.decompress(data[CACHE_HEADER.size:])
+            data.close()
+            data, base = payload, 0
+        else: base = CACHE_HEADER.size
+        self.data, self.count, self.version = data, count, version
+        self.record = CACHE_RECORD if version >= 2 else CACHE_RECORD_V1
+        self.table = base
+        self.blob = base + count * self.record.size
+
+    def __len__(self): return self.count
+
+    def __getitem__(self, i):
+        if i < 0: i += self.count
+        if not 0 <= i < self.count: raise IndexError(i)
+        rec = self.record.unpack_from(self.data, self.table + i * self.record.size)
+        off, ln, size = rec[:3]
+        name = self.data[self.blob + off:self.blob + off + ln].decode('utf-8', 'replace')
+        md5 = rec[3].hex() if len(rec) > 3 and rec[3] != CACHE_NO_MD5 else None
+        return {'name': name, 'size': None if size == CACHE_NO_SIZE else size, 'md5': md5}
 
-def fetch_html_list(sys_name, url, ext, force_refresh=False):
-    cache_file = get_cache_path(sys_name)
-    if not force_refresh and os.path.exists(cache_file):
+    def __iter__(self):
+        for i in range(self.count): yield self[i]
+
+def write_cache_bin(path, files):
+    table, blob, off = bytearray(), bytearray(), 0
+    for it in files:
+        name = it['name'].encode('utf-8')
+        try: size = int(float(it['size'])) if it['size'] is not None else CACHE_NO_SIZE
+        except: size = 0
+        try: md5 = bytes.fromhex(it.get('md5') or '')
+        except ValueError: md5 = b''
+        table += CACHE_RECORD.pack(off, len(name), size, md5 if len(md5) == 16 else CACHE_NO_MD5)
+        blob += name
+        off += len(name)
+    payload = bytes(table + blob)
+    flags = 0
+    if SETTINGS['cache_compress']:
+        payload = zlib.compress(payload, 6)
+        flags |= CACHE_FLAG_ZLIB
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, flags, len(files)))
+        f.write(payload)
+    os.replace(tmp, path)
+
+LRU_LOCK = threading.Lock()
+
+def lru_touch(sys_name, evict=False):
+    with LRU_LOCK:
         try:
-            with open(cache_file, "r") as f: return json.load(f), None
+            with open(LRU_FILE, "r") as f: used = json.load(f)
+        except: used = {}
+        key = os.path.basename(get_cache_path(sys_name, ""))
+        used[key] = time.time()
+        if evict: used = evict_cache(used, key)
+        try:
+            with open(LRU_FILE, "w") as f: json.dump(used, f)
         except: pass
+
+def evict_cache(used, keep):
+    # drop whole collections (list + sidecars), least recently used first, until under the cap
+    groups = {}
+    for fname in os.listdir(CACHE_DIR):
+        if fname.endswith(".tmp") or fname == os.path.basename(LRU_FILE): continue
+        key = fname.split(".", 1)[0]
+        try: groups.setdefault(key, []).append((fname, os.path.getsize(os.path.join(CACHE_DIR, fname))))
+        except OSError: pass
+    total = sum(sz for files in groups.values() for _, sz in files)
+    for key in sorted(groups, key=lambda k: used.get(k, 0)):
+        if total <= SETTINGS['cache_max_mb'] * 1024 * 1024: break
+        if key == keep: continue
+        for fname, sz in groups[key]:
+            try:
+                os.remove(os.path.join(CACHE_DIR, fname))
+                total -= sz
+            except OSError: pass
+        used.pop(key, None)
+        log(f"Cache evicted: {key}")
+    return used
+
+def load_cache(sys_name):
+    files = read_cache(sys_name)
+    if files is not None: lru_touch(sys_name)
+    return files
+
+def read_cache(sys_name):
+    files = None
+    with PROFILE.span("cache.load"):
+        try: files = CachedList(get_cache_path(sys_name, ".bin"))
+        except FileNotFoundError: pass
+        except Exception as e: log(f"Cache read failed: {e}")
+        if files is None:
+            # caches written by older versions
+            try:
+                with open(get_cache_path(sys_name), "r") as f: files = json.load(f)
+            except: return None
+    return files
+
+def cache_stamp(sys_name):
+    for sfx in (".bin", ".json"):
+        try:
+            st = os.stat(get_cache_path(sys_name, sfx))
+            return (sfx, st.st_mtime_ns, st.st_size)
+        except OSError: pass
+    return None
+
+def load_cache_meta(sys_name):
+    try:
+        with open(get_meta_path(sys_name), "r") as f: return json.load(f)
+    except:
+        # caches written before validators were stored only have their mtime
+        try: return {'fetched': os.path.getmtime(get_cache_path(sys_name))}
+        except: return {}
+
+def save_cache_meta(sys_name, meta):
+    try:
+        tmp = get_meta_path(sys_name) + ".tmp"
+        with open(tmp, "w") as f: json.dump(meta, f)
+        os.replace(tmp, get_meta_path(sys_name))
+    except Exception as e: log(f"Cache meta save failed: {e}")
+
+def save_cache(sys_name, files, response):
+    with PROFILE.span("cache.save"): write_cache_bin(get_cache_path(sys_name, ".bin"), files)
+    if os.path.exists(get_cache_path(sys_name)): os.remove(get_cache_path(sys_name))
+    lru_touch(sys_name, evict=True)
+    save_cache_meta(sys_name, {'etag': response.getheader('ETag'), 'last_modified': response.getheader('Last-Modified'), 'fetched': time.time()})
+
+def touch_cache(sys_name):
+    meta = load_cache_meta(sys_name)
+    meta['fetched'] = time.time()
+    save_cache_meta(sys_name, meta)
+
+def conditional_headers(meta):
+    headers = dict(HEADERS)
+    if meta and meta.get('etag'): headers['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'): headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+def cached_list(sys_name, ttl, refetch):
+    # stale-while-revalidate: hand back the cached list now, refresh it in the background
+    files = load_cache(sys_name)
+    if files is None: return None
+    meta = load_cache_meta(sys_name)
+    if ttl > 0 and time.time() - meta.get('fetched', 0) > ttl:
+        with REVALIDATE_LOCK:
+            if sys_name in REVALIDATING: return files
+            REVALIDATING.add(sys_name)
+        def worker():
+            try:
+                _, err = refetch(meta)
+                log(f"Revalidated {sys_name}: {err or 'OK'}")
+            finally:
+                with REVALIDATE_LOCK: REVALIDATING.discard(sys_name)
+        threading.Thread(target=worker, daemon=True).start()
+    return files
+
+def not_modified(sys_name, e):
+    if isinstance(e, HTTPError) and e.code == 304:
+        touch_cache(sys_name)
+        return True
+    return False
+
+# --- HTTP CLIENT ---
+# One keep-alive connection pool shared by list fetches and downloads, so
+# archive.org and its data nodes are not re-handshaked for every request.
+class HTTPError(Exception):
+    def __init__(self, url, code, headers):
+        super().__init__(f"HTTP {code}: {url}")
+        self.url, self.code, self.headers = url, code, headers
+
+class TransientStatus(Exception): pass
+
+class PooledResponse:
+    def __init__(self, pool, key, conn, resp, url):
+        self.pool, self.key, self.conn, self.resp, self.url = pool, key, conn, resp, url
+        self.status = resp.status
+
+    def getheader(self, name, default=None): return self.resp.getheader(name, default)
+
+    def read(self, amt=None): return self.resp.read(amt)
+
+    def readinto(self, buf): return self.resp.readinto(buf)
+
+    def close(self):
+        if self.conn is None: return
+        # only a fully drained response leaves the connection reusable
+        if self.resp.isclosed() and not self.resp.will_close: self.pool._release(self.key, self.conn)
+        else:
+            self.resp.close()
+            self.conn.close()
+        self.conn = None
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+class HTTPPool:
+    REDIRECTS = (301, 302, 303, 307, 308)
+    RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_idle=4, retries=3, backoff=0.5, backoff_cap=8.0):
+        self.max_idle, self.retries = max_idle, retries
+        self.backoff, self.backoff_cap = backoff, backoff_cap
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.ctx = None
+        self.stats = {'requests': 0, 'reused': 0, 'connects': 0, 'retries': 0, 'redirects': 0, 'connect_time': 0.0, 'ttfb': 0.0}
+
+    def _acquire(self, key, timeout):
+        with self.lock:
+            conns = self.idle.get(key)
+            if conns: return conns.pop(), True
+        scheme, host, port = key
+        import http.client
+        if scheme == "https":
+            if self.ctx is None:
+                import ssl
+                self.ctx = ssl._create_unverified_context()
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ctx)
+        else: conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        return conn, False
+
+    def _release(self, key, conn):
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) < self.max_idle:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def _send(self, url, headers, method, timeout):
+        import http.client
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query: path += "?" + parts.query
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            t0 = time.time()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    with self.lock:
+                        self.stats['connects'] += 1
+                        self.stats['connect_time'] += time.time() - t0
+                else: conn.sock.settimeout(timeout)
+                conn.request(method, path, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused: continue  # the server dropped an idle connection; not a real failure
+                raise
+            except:
+                conn.close()
+                raise
+            ttfb = time.time() - t0
+            with self.lock:
+                self.stats['requests'] += 1
+                self.stats['reused'] += reused
+                self.stats['ttfb'] += ttfb
+            log(f"HTTP {method} {key[1]} {resp.status} reused={int(reused)} ttfb={ttfb*1000:.0f}ms")
+            return PooledResponse(self, key, conn, resp, url)
+
+    def request(self, url, headers=None, method="GET", timeout=30, retries=None):
+        import http.client
+        headers = dict(HEADERS if headers is None else headers)
+        if retries is None: retries = self.retries
+        attempt = 0
+        while True:
+            try:
+                for _ in range(10):
+                    r = self._send(url, headers, method, timeout)
+                    if r.status in self.REDIRECTS and r.getheader('Location'):
+                        # archive.org redirects /download/ to the data node holding the item
+                        r.read()
+                        r.close()
+                        url = urllib.parse.urljoin(url, r.getheader('Location'))
+                        with self.lock: self.stats['redirects'] += 1
+                        continue
+                    if r.status in self.RETRY_STATUS and attempt < retries:
+                        r.read()
+                        r.close()
+                        raise TransientStatus(f"HTTP {r.status}")
+                    if r.status >= 300:
+                        r.read()
+                        r.close()
+                        raise HTTPError(url, r.status, r.resp.headers)
+                    return r
+                raise HTTPError(url, r.status, None)
+            except HTTPError: raise
+            except (OSError, http.client.HTTPException, TransientStatus) as e:
+                if attempt >= retries: raise
+                attempt += 1
+                delay = min(self.backoff_cap, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                with self.lock: self.stats['retries'] += 1
+                log(f"HTTP retry {attempt} in {delay:.1f}s: {url}: {e}")
+                time.sleep(delay)
+
+    def summary(self):
+        with self.lock: st = dict(self.stats)
+        n = max(1, st['requests'])
+        return (f"requests={st['requests']} reused={st['reused']} ({100*st['reused']//n}%) connects={st['connects']} "
+                f"retries={st['retries']} redirects={st['redirects']} avg_connect={1000*st['connect_time']/max(1, st['connects']):.0f}ms "
+                f"avg_ttfb={1000*st['ttfb']/n:.0f}ms")
+
+HTTP = HTTPPool()
+
+# --- NETWORK ---
+class ListingScanner:
+    # Parses a listing page chunk by chunk as it downloads. Rows of
+    # archive.org's directory-listing-table are cut out with regexes; any
+    # other page is handed to LinkParser.
+    MARKER = 'directory-listing-table'
+    ROW = re.compile(r'<tr[\s>].*?</tr\s*>', re.S | re.I)
+    HREF = re.compile(r'<a\s[^>]*?href\s*=\s*"([^"]*)"', re.I)
+    CELL = re.compile(r'<td[^>]*>(.*?)</td\s*>', re.S | re.I)
+    TAG = re.compile(r'<[^>]*>')
+    SNIFF_LIMIT = 256 * 1024
+
+    def __init__(self, ext):
+        self.ext = ext.lower()
+        self.links = []
+        self.buf = ""
+        self.fast = None  # undecided until the first table (or enough of the page) is seen
+        self.parser = None
+
+    def feed(self, text):
+        if self.parser:
+            self.parser.feed(text)
+            return
+        buf = self.buf + text
+        if self.fast is None:
+            i = buf.find(self.MARKER)
+            if i >= 0:
+                self.fast = True
+                buf = buf[i:]
+            else:
+                t = buf.find('<table')
+                if (t >= 0 and buf.find('>', t) >= 0) or len(buf) > self.SNIFF_LIMIT: return self._fallback(buf)
+                self.buf = buf
+                return
+        pos = 0
+        for m in self.ROW.finditer(buf):
+            self._row(m.group())
+            pos = m.end()
+        self.buf = buf[pos:]
+
+    def close(self):
+        if self.fast: return
+        if self.parser is None: self._fallback(self.buf)
+        self.parser.close()
+
+    def _fallback(self, buf):
+        self.fast, self.buf = False, ""
+        self.parser = link_parser(self.ext)
+        self.links = self.parser.links
+        self.parser.feed(buf)
+
+    def _row(self, row):
+        m = self.HREF.search(row)
+        if not m: return
+        raw = m.group(1)
+        if '&' in raw:
+            import html
+            raw = html.unescape(raw)
+        name = listing_link(raw, self.ext)
+        if name is None: return
+        size = None
+        for cell in reversed(self.CELL.findall(row)):
+            size = parse_listing_size(self.TAG.sub('', cell).strip())
+            if size is not None: break
+        self.links.append({'name': name, 'size': size})
+
+def fetch_html_list(sys_name, url, ext, force_refresh=False, ttl=0, validators=None, retries=None):
+    if not force_refresh:
+        files = cached_list(sys_name, ttl, lambda meta: fetch_html_list(sys_name, url, ext, True, ttl, meta))
+        if files is not None: return files, None
     
     log(f"Scraping: {url}")
-    req = urllib.request.Request(url, headers=HEADERS)
     try:
-        with urllib.request.urlopen(req, timeout=20) as r:
-            parser = LinkParser(ext)
-            parser.feed(r.read().decode('utf-8', errors='ignore'))
-            files = parser.links
+        with PROFILE.span("fetch.html"), HTTP.request(url, conditional_headers(validators), timeout=20, retries=retries) as r:
+            scanner = ListingScanner(ext)
+            decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+            parse_time = 0.0
+            while True:
+                chunk = r.read(65536)
+                if not chunk: break
+                PROFILE.count("fetch.bytes", len(chunk))
+                t0 = time.perf_counter()
+                scanner.feed(decoder.decode(chunk))
+                parse_time += time.perf_counter() - t0
+            scanner.feed(decoder.decode(b"", True))
+            scanner.close()
+            PROFILE.add("parse.html", parse_time)
+            files = scanner.links
             files.sort(key=lambda x: x['name'])
-            with open(cache_file, "w") as f: json.dump(files, f)
+            save_cache(sys_name, files, r)
             return files, None
-    except Exception as e: return None, "Scrape Failed"
+    except Exception as e:
+        if not_modified(sys_name, e): return load_cache(sys_name), None
+        return None, "Scrape Failed"
 
-def fetch_api_list(sys_name, ident, folder_filter, ext, force_refresh=False):
-    cache_file = get_cache_path(sys_name)
-    if not force_refresh and os.path.exists(cache_file):
-        try:
-            with open(cache_file, "r") as f: return json.load(f), None
-        except: pass
+def match_extension(lname, ext):
+    if ext == ".pbp": return lname.endswith(('.pbp', '.iso', '.cso', '.chd', '.bin', '.zip'))
+    if ext == ".iso": return lname.endswith(('.iso', '.cso', '.zip'))
+    return lname.endswith(ext) or lname.endswith('.zip') or lname.endswith('.7z')
+
+class MetadataFilesScanner:
+    # Incremental reader for the /metadata/{ident} response. Walks the
+    # top-level "files" array as bytes arrive and decodes one entry at a time,
+    # so the whole document is never held in memory.
+    TOKEN = re.compile(r'[{}\[\]"]')
+    STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+    SKIP = re.compile(r'[\s,]*')
+    VALUE = re.compile(r'\s*:\s*("(?:[^"\\]|\\.)*")')
+    NODE_FIELDS = ('server', 'd1', 'd2', 'dir')  # where the item is stored, kept in self.fields
+
+    def __init__(self, on_entry):
+        self.on_entry = on_entry
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.depth = 0
+        self.key = None
+        self.in_files = False
+        self.found_files = False
+        self.fields = {}
+
+    def feed(self, data, final=False):
+        buf = self.buf + self.decoder.decode(data, final)
+        pos = 0
+        while True:
+            if self.in_files:
+                pos = self.SKIP.match(buf, pos).end()
+                if pos >= len(buf): break
+                if buf[pos] == ']':
+                    self.in_files, self.found_files = False, True
+                    self.depth -= 1
+                    pos += 1
+                    continue
+                try: entry, pos = self.json.raw_decode(buf, pos)
+                except ValueError:
+                    if final: raise
+                    break  # entry not complete yet
+                if isinstance(entry, dict): self.on_entry(entry)
+                continue
+            m = self.TOKEN.search(buf, pos)
+            if not m:
+                pos = len(buf)
+                break
+            c, pos = m.group(), m.start()
+            if c == '"':
+                sm = self.STRING.match(buf, pos)
+                if not sm: break  # wait for the rest of the string
+                pos = sm.end()
+                if self.depth == 1:
+                    self.key = sm.group()[1:-1]
+                    if self.key in self.NODE_FIELDS:
+                        vm = self.VALUE.match(buf, pos)
+                        if vm:
+                            self.fields[self.key] = json.loads(vm.group(1))
+                            pos = vm.end()
+                        elif not final and len(buf) - pos < 256:
+                            pos = sm.start()
+                            break  # wait for the value
+            elif c in '{[':
+                self.depth += 1
+                pos += 1
+                if c == '[' and self.depth == 2 and self.key == 'files': self.in_files = True
+            else:
+                self.depth -= 1
+                pos += 1
+        self.buf = buf[pos:]
+
+def fetch_api_list(sys_name, ident, folder_filter, ext, force_refresh=False, ttl=0, validators=None, retries=None):
+    if not force_refresh:
+        files = cached_list(sys_name, ttl, lambda meta: fetch_api_list(sys_name, ident, folder_filter, ext, True, ttl, meta))
+        if files is not None: return files, None
         
-    url = f"https://archive.org/metadata/{ident}"
+    url = f"{ARCHIVE_URL}/metadata/{ident}"
     log(f"API: {url}")
-    req = urllib.request.Request(url, headers=HEADERS)
     try:
-        with urllib.request.urlopen(req, timeout=15) as r:
-            data = json.loads(r.read().decode())
-            if 'files' not in data: return None, "Empty Lib"
+        with PROFILE.span("fetch.api"), HTTP.request(url, conditional_headers(validators), timeout=15, retries=retries) as r:
             files = []
-            for f in data['files']:
-                fname = f['name']
-                if folder_filter and folder_filter not in fname: continue
-                lname = fname.lower()
-                is_match = False
-                
-                # EXTENSION CHECK
-                if ext == ".pbp":
-                    if lname.endswith('.pbp') or lname.endswith('.iso') or lname.endswith('.cso') or lname.endswith('.chd') or lname.endswith('.bin') or lname.endswith('.zip'): is_match = True
-                elif ext == ".iso":
-                    if lname.endswith('.iso') or lname.endswith('.cso') or lname.endswith('.zip'): is_match = True
-                else:
-                    if lname.endswith(ext) or lname.endswith('.zip') or lname.endswith('.7z'): is_match = True
-                
-                if is_match:
-                    files.append({'name': fname, 'size': f.get('size', 0)})
+            def on_entry(f):
+                fname = f.get('name')
+                if not fname: return
+                if folder_filter and folder_filter not in fname: return
+                if match_extension(fname.lower(), ext):
+                    files.append({'name': fname, 'size': f.get('size', 0), 'md5': f.get('md5')})
+            scanner = MetadataFilesScanner(on_entry)
+            parse_time = 0.0
+            while True:
+                chunk = r.read(65536)
+                if not chunk: break
+                PROFILE.count("fetch.bytes", len(chunk))
+                t0 = time.perf_counter()
+                scanner.feed(chunk)
+                parse_time += time.perf_counter() - t0
+            scanner.feed(b"", True)
+            PROFILE.add("parse.api", parse_time)
+            if not scanner.found_files: return None, "Empty Lib"
+            save_node_info(ident, scanner.fields)
             files.sort(key=lambda x: x['name'])
-            with open(cache_file, "w") as f: json.dump(files, f)
+            save_cache(sys_name, files, r)
             return files, None
-    except Exception as e: return None, "API Failed"
+    except Exception as e:
+        if not_modified(sys_name, e): return load_cache(sys_name), None
+        return None, "API Failed"
+
+# --- COLLECTION PAGES ---
+# "COLLECTION" entries list the items of a whole archive.org collection via
+# the scrape API, PAGE_ROWS at a time. advancedsearch is not used: it stops
+# paging at 10,000 results. Scrape pages are chained by a cursor handed out
+# with the page before, so each page's cursor is cached with it. Pages are
+# fetched as the list is scrolled and cached next to the other lists
+# (<name>.pN.json), and only the last few pages used are kept in memory.
+PAGE_ROWS = 100  # also the smallest count scrape accepts
+PAGES_IN_MEMORY = 8
+PAGE_RETRY = 10  # seconds before a failed page is asked for again
+
+def page_url(sys_data, term, cursor):
+    q = f"collection:({sys_data[2]})"
+    if sys_data[3]: q += f" AND ({sys_data[3]})"
+    if term: q += f" AND ({term})"
+    params = [('q', q), ('fields', 'identifier,title,item_size'), ('count', PAGE_ROWS)]
+    if cursor: params.append(('cursor', cursor))
+    return f"{ARCHIVE_URL}/services/search/v1/scrape?{urllib.parse.urlencode(params)}"
+
+class PagedList:
+    # Sequence of a collection's items. Rows on a page that is not loaded yet
+    # read as None while a background thread fetches it, nearest request first.
+    def __init__(self, sys_data, term=""):
+        self.sys_data, self.term = sys_data, term
+        self.count = 0
+        self.pages = {}      # page -> [item], least recently used first
+        self.wanted = []     # pages to fetch, newest last
+        self.failed = {}     # page -> time of the failure
+        self.cursors = {0: None}  # page -> scrape cursor it starts at
+        self.lock = threading.Lock()
+        self.thread = None
+        self.version = 0
+
+    def page_path(self, page):
+        # searches are not written to disk, only the plain listing
+        return None if self.term else get_cache_path(self.sys_data[0], f".p{page}.json")
+
+    def open(self, force_refresh=False, retries=None):
+        # page 0 is loaded up front: it carries the number of items
+        cached = self._read(0)
+        if cached and not force_refresh and self._fresh(cached):
+            self.count = cached['found']
+            self._cursor(0, cached)
+            self._keep(0, cached['items'])
+            return None
+        try: found, items = self._fetch(0, retries)
+        except Exception as e:
+            log(f"Collection page failed: {self.sys_data[0]}: {e}")
+            if not cached: return "Search Failed"
+            found, items = cached['found'], cached['items']
+            self._cursor(0, cached)
+        if not found: return "Empty Collection"
+        self.count = found
+        self._keep(0, items)
+        return None
+
+    def _read(self, page):
+        path = self.page_path(page)
+        if path is None: return None
+        try:
+            with open(path, "r") as f: return json.load(f)
+        except: return None
+
+    def _fresh(self, cached):
+        ttl = self.sys_data[7]
+        return ttl <= 0 or time.time() - cached.get('fetched', 0) <= ttl
+
+    def _cursor(self, page, data):
+        # the cursor that follows a page arrives with it; the last page has none
+        with self.lock:
+            if data.get('cursor'): self.cursors[page + 1] = data['cursor']
+
+    def _fetch(self, page, retries=None):
+        url = page_url(self.sys_data, self.term, self.cursors[page])
+        log(f"COLLECTION: {url}")
+        with PROFILE.span("fetch.page"), HTTP.request(url, timeout=15, retries=retries) as r:
+            data = json.loads(r.read().decode('utf-8', 'replace'))
+        items = []
+        for d in data.get('items', []):
+            if not d.get('identifier'): continue
+            title = d.get('title')
+            if isinstance(title, list): title = title[0] if title else None
+            items.append({'name': d['identifier'], 'size': d.get('item_size'), 'title': title})
+        # only the first page carries the total
+        found = int(data.get('total', 0)) if page == 0 else self.count
+        self._cursor(page, data)
+        path = self.page_path(page)
+        if path is not None:
+            try:
+                with open(path + ".tmp", "w") as f: json.dump({'found': found, 'items': items, 'cursor': data.get('cursor'), 'fetched': time.time()}, f)
+                os.replace(path + ".tmp", path)
+                if page == 0: save_cache_meta(self.sys_data[0], {'fetched': time.time()})
+                lru_touch(self.sys_data[0], evict=True)
+            except Exception as e: log(f"Page save failed: {e}")
+        return found, items
+
+    def _keep(self, page, items):
+        with self.lock:
+            self.pages.pop(page, None)
+            self.failed.pop(page, None)
+            self.pages[page] = items
+            while len(self.pages) > PAGES_IN_MEMORY: del self.pages[next(iter(self.pages))]
+            self.version += 1
+
+    def page(self, page, prefetch=False):
+        with self.lock:
+            items = self.pages.get(page)
+            if items is not None:
+                self.pages[page] = self.pages.pop(page)
+                return items
+            queued = page in self.wanted
+        cached = None if queued else self._read(page)
+        # pages cached while the collection had a different size may have shifted
+        if cached and self._fresh(cached) and cached['found'] == self.count:
+            self._cursor(page, cached)
+            self._keep(page, cached['items'])
+            return cached['items']
+        with self.lock:
+            if time.time() - self.failed.get(page, 0) < PAGE_RETRY: return None
+            if prefetch:
+                # behind everything the screen is waiting for
+                if page not in self.wanted: self.wanted.insert(0, page)
+            else:
+                if page in self.wanted: self.wanted.remove(page)
+                self.wanted.append(page)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._worker, daemon=True)
+                self.thread.start()
+        return None
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                if not self.wanted: return
+                page = self.wanted[-1]
+                if page in self.pages:
+                    self.wanted.pop()
+                    continue
+                # a page can only be asked for with the cursor from the one before:
+                # walk forward from the last page whose cursor is known
+                step = max(p for p in self.cursors if p <= page)
+                if step == page: self.wanted.pop()
+            if step != page:
+                if not self._skip(step):
+                    with self.lock:
+                        if page in self.wanted: self.wanted.remove(page)
+                        self.failed[page] = time.time()
+                        self.version += 1
+                continue
+            try: _, items = self._fetch(page)
+            except Exception as e:
+                log(f"Collection page failed: {self.sys_data[0]} page {page}: {e}")
+                cached = self._read(page)
+                if cached:
+                    items = cached['items']  # offline: a stale page beats none
+                    self._cursor(page, cached)
+                else:
+                    with self.lock:
+                        self.failed[page] = time.time()
+                        self.version += 1
+                    continue
+            self._keep(page, items)
+
+    def _skip(self, page):
+        # a page passed over on the way to another: only its cursor is kept
+        cached = self._read(page)
+        if cached and self._fresh(cached) and cached['found'] == self.count and cached.get('cursor'):
+            self._cursor(page, cached)
+            return True
+        try: self._fetch(page)
+        except Exception as e:
+            log(f"Collection page failed: {self.sys_data[0]} page {page}: {e}")
+            return False
+        return page + 1 in self.cursors
+
+    def state(self, i):
+        with self.lock: return "FAILED" if i // PAGE_ROWS in self.failed and i // PAGE_ROWS not in self.pages else "LOADING"
+
+    def busy(self):
+        with self.lock: return bool(self.wanted) or (self.thread is not None and self.thread.is_alive())
+
+    def __len__(self): return self.count
+
+    def __getitem__(self, i):
+        if i < 0: i += self.count
+        if not 0 <= i < self.count: raise IndexError(i)
+        page, row = divmod(i, PAGE_ROWS)
+        items = self.page(page)
+        # ask for the next page before the selection reaches it
+        if row >= PAGE_ROWS // 2 and (page + 1) * PAGE_ROWS < self.count: self.page(page + 1, True)
+        return items[row] if items is not None and row < len(items) else None
+
+    def __iter__(self):
+        for i in range(self.count): yield self[i]
+
+def fetch_paged(sys_data, force_refresh=False, term="", retries=None):
+    items = PagedList(sys_data, term)
+    err = items.open(force_refresh, retries)
+    return (None, err) if err else (items, None)
+
+def item_collection(sys_data, ident):
+    # an API entry for one item of a COLLECTION list, cached under its own name
+    return (f"{sys_data[0]} / {ident}", "API", ident, "", sys_data[4], sys_data[5], sys_data[6], sys_data[7], sys_data[8])
+
+def fetch_collection(sys_data, force_refresh=False, validators=None, retries=None):
+    if sys_data[1] == "COLLECTION": return fetch_paged(sys_data, force_refresh, "", retries)
+    if sys_data[1] == "API": return fetch_api_list(sys_data[0], sys_data[2], sys_data[3], sys_data[5], force_refresh, sys_data[7], validators, retries)
+    return fetch_html_list(sys_data[0], sys_data[2], sys_data[5], force_refresh, sys_data[7], validators, retries)
+
+# --- BULK REFRESH ---
+class CollectionRefresher:
+    # Fetches many collections at once with at most `workers` connections.
+    def __init__(self, workers):
+        self.workers = workers
+        self.state = {}
+        self.lock = threading.Lock()
+        self.version = 0
+
+    def _set(self, name, status):
+        with self.lock:
+            if status is None: self.state.pop(name, None)
+            else: self.state[name] = status
+            self.version += 1
+
+    def busy(self):
+        with self.lock: return any(st in ("WAITING", "FETCHING") for st in self.state.values())
+
+    def refresh(self, collections, force_refresh=True):
+        pending = queue.Queue()
+        with self.lock:
+            for sys_data in collections:
+                if self.state.get(sys_data[0]) in ("WAITING", "FETCHING"): continue
+                self.state[sys_data[0]] = "WAITING"
+                pending.put(sys_data)
+            self.version += 1
+        for _ in range(min(self.workers, pending.qsize())):
+            threading.Thread(target=self._worker, args=(pending, force_refresh), daemon=True).start()
+
+    def _worker(self, pending, force_refresh):
+        while True:
+            try: sys_data = pending.get_nowait()
+            except queue.Empty: return
+            self._set(sys_data[0], "FETCHING")
+            try: files, err = self._fetch(sys_data, force_refresh)
+            except Exception as e: files, err = None, str(e)
+            if not files: log(f"Refresh failed: {sys_data[0]}: {err}")
+            self._set(sys_data[0], None if files else "FAILED")
+
+    def _fetch(self, sys_data, force_refresh):
+        if force_refresh or sys_data[1] == "COLLECTION": return fetch_collection(sys_data, force_refresh)
+        # a stale list is re-checked on this worker, not on a revalidation
+        # thread of its own, so the row reads FETCHING and the limit holds
+        meta = load_cache_meta(sys_data[0])
+        stale = sys_data[7] > 0 and time.time() - meta.get('fetched', 0) > sys_data[7]
+        return fetch_collection(sys_data, stale, meta if stale else None)
+
+def format_age(seconds):
+    if seconds < 3600: return f"{int(seconds // 60)}m"
+    if seconds < 86400: return f"{int(seconds // 3600)}h"
+    return f"{int(seconds // 86400)}d"
+
+def collection_status(sys_data, refresher):
+    status = refresher.state.get(sys_data[0])
+    if status: return status
+    if not any(os.path.exists(get_cache_path(sys_data[0], sfx)) for sfx in (".bin", ".json", ".p0.json")): return "-"
+    fetched = load_cache_meta(sys_data[0]).get('fetched')
+    return f"CACHED {format_age(max(0, time.time() - fetched))}" if fetched else "CACHED"
+
+PARTS_LOCK = threading.Lock()
+
+def load_part_info(dest):
+    with PARTS_LOCK:
+        try:
+            with open(PARTS_FILE, "r") as f: return json.load(f).get(dest)
+        except: return None
+
+def save_part_info(dest, info):
+    with PARTS_LOCK:
+        try:
+            with open(PARTS_FILE, "r") as f: data = json.load(f)
+        except: data = {}
+        if info is None: data.pop(dest, None)
+        else: data[dest] = info
+        try:
+            tmp = PARTS_FILE + ".tmp"
+            with open(tmp, "w") as f: json.dump(data, f)
+            os.replace(tmp, PARTS_FILE)
+        except: pass
+
+def parse_content_range(value):
+    # "bytes 100-199/1000" -> (100, 1000); total is None for "*"
+    m = re.match(r'bytes\s+(\d+)-\d+/(\d+|\*)', value or "")
+    if not m: return None, None
+    return int(m.group(1)), (int(m.group(2)) if m.group(2) != '*' else None)
+
+def part_validator(info):
+    etag = info.get('etag')
+    if etag and not etag.startswith('W/'): return etag
+    return info.get('last_modified')
+
+class RateLimiter:
+    # Token bucket shared by every download connection; rate 0 means no cap.
+    # Readers take what they just received and sleep off any debt, so the
+    # combined rate holds however many connections are open.
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock: self.rate, self.tokens, self.stamp = rate, 0.0, time.monotonic()
+
+    def take(self, n, cancel=None):
+        with self.lock:
+            if not self.rate: return
+            now = time.monotonic()
+            self.tokens = min(self.rate * 0.5, self.tokens + (now - self.stamp) * self.rate) - n
+            self.stamp = now
+            wait = -self.tokens / self.rate
+        while wait > 0 and not (cancel is not None and cancel.is_set()):
+            time.sleep(min(wait, 0.25))
+            wait -= 0.25
+
+    def block(self, size):
+        # keep single reads small enough that a cap does not turn into bursts
+        rate = self.rate
+        return size if not rate else max(BLOCK_MIN, min(size, rate // 8))
+
+LIMITER = RateLimiter()
+
+class TransferMeter:
+    # Speed for progress display: an exponential moving average over ~0.5 s
+    # samples, so the number does not jump with every read.
+    def __init__(self, done=0):
+        self.sample_time, self.sample_done = time.monotonic(), done
+        self.speed = 0.0
+
+    def update(self, done):
+        now = time.monotonic()
+        dt = now - self.sample_time
+        if dt < 0.5: return False
+        rate = (done - self.sample_done) / dt
+        self.speed = rate if not self.speed else 0.3 * rate + 0.7 * self.speed
+        self.sample_time, self.sample_done = now, done
+        return True
+
+def next_block(speed):
+    # about 50 ms worth of data per read
+    return LIMITER.block(max(BLOCK_MIN, min(BLOCK_MAX, int(speed * 0.05))))
+
+# --- CARD WRITER ---
+# A download hands its data to a writer thread through a small pool of
+# buffers, so a stall on the SD card only holds up the socket once every
+# buffer is waiting. Sequential data is gathered into WRITE_BLOCK writes
+# aligned to the block size; each buffer goes out with one pwrite at its
+# offset, and the card is flushed every FSYNC_EVERY bytes, not per write.
+FALLOC_FL_KEEP_SIZE = 1
+FALLOCATE = None
+
+def preallocate(fd, size):
+    # fallocate(2) with KEEP_SIZE reserves the space in one piece without
+    # changing the file size, which resuming relies on. os.posix_fallocate is
+    # not used: where the filesystem lacks fallocate (FAT), glibc falls back
+    # to writing every block of the file.
+    global FALLOCATE
+    if FALLOCATE is None:
+        try:
+            import ctypes
+            FALLOCATE = ctypes.CDLL(None, use_errno=True).fallocate64
+            FALLOCATE.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+        except: FALLOCATE = False
+    if FALLOCATE and size > 0: FALLOCATE(fd, FALLOC_FL_KEEP_SIZE, 0, size)  # failure just means no preallocation
+
+def finalize(part, dest):
+    # the .part is already flushed; make the rename itself durable too
+    os.replace(part, dest)
+    try:
+        fd = os.open(os.path.dirname(dest) or ".", os.O_RDONLY)
+        try: os.fsync(fd)
+        finally: os.close(fd)
+    except OSError: pass
+
+class CardWriter:
+    def __init__(self, path, size=0, pos=0, fresh=False, buffers=WRITE_BUFFERS, block=WRITE_BLOCK):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if fresh else 0), 0o644)
+        preallocate(self.fd, size)
+        self.block, self.spare = block, buffers
+        self.lock = threading.Lock()
+        self.free, self.full = queue.Queue(), queue.Queue()
+        self.pos, self.buf, self.fill = pos, None, 0  # sequential writes gather here
+        self.unsynced = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _take(self):
+        if self.error: raise self.error
+        with self.lock:
+            if self.spare:
+                self.spare -= 1
+                return bytearray(self.block)
+        t0 = time.perf_counter()
+        buf = self.free.get()  # every buffer is queued: wait for the card
+        PROFILE.add("dl.stall", time.perf_counter() - t0)
+        if self.error: raise self.error
+        return buf
+
+    def write_at(self, pos, data):
+        # up to one block at pos, from any thread (segmented downloads)
+        buf = self._take()
+        n = len(data)
+        buf[:n] = data
+        self.full.put((pos, buf, n))
+
+    def write(self, data):
+        # the next bytes of a single stream
+        data = memoryview(data)
+        while data:
+            if self.buf is None: self.buf, self.fill = self._take(), 0
+            # after a resume, the first block only runs up to a block boundary
+            room = self.block - (self.pos + self.fill) % self.block
+            n = min(room, len(data))
+            self.buf[self.fill:self.fill + n] = data[:n]
+            self.fill += n
+            data = data[n:]
+            if n == room: self._push()
+
+    def _push(self):
+        if self.buf is None or not self.fill: return
+        self.full.put((self.pos, self.buf, self.fill))
+        self.pos += self.fill
+        self.buf, self.fill = None, 0
+
+    def _run(self):
+        while True:
+            item = self.full.get()
+            if item is None: return
+            if isinstance(item, threading.Event):
+                # a sync marker: everything queued before it has been written
+                if self.error is None:
+                    try:
+                        os.fsync(self.fd)
+                        self.unsynced = 0
+                    except OSError as e: self.error = e
+                item.set()
+                continue
+            pos, buf, n = item
+            if self.error is None:
+                try:
+                    t0 = time.perf_counter()
+                    view = memoryview(buf)[:n]
+                    while view:
+                        w = os.pwrite(self.fd, view, pos)
+                        view, pos = view[w:], pos + w
+                    self.unsynced += n
+                    if self.unsynced >= FSYNC_EVERY:
+                        os.fsync(self.fd)
+                        self.unsynced = 0
+                    PROFILE.add("dl.card", time.perf_counter() - t0)
+                except OSError as e:
+                    log(f"Card write failed: {e}")
+                    self.error = e
+            self.free.put(buf)
+
+    def sync(self):
+        # everything handed over before this call is on the card when it returns
+        self._push()
+        done = threading.Event()
+        self.full.put(done)
+        done.wait()
+        if self.error: raise self.error
+
+    def close(self):
+        try: self.sync()
+        finally:
+            self.full.put(None)
+            self.thread.join()
+            # a download that stopped early hands back the space reserved past its end
+            try: os.ftruncate(self.fd, os.fstat(self.fd).st_size)
+            except OSError: pass
+            os.close(self.fd)
+
+class SegmentedDownload:
+    # Splits [0, size) into byte ranges fetched on parallel connections. Each
+    # segment is [next_byte, end, taken]; idle workers steal the back half of
+    # the largest unfinished segment, so the connection count can grow mid-file.
+    def __init__(self, url, part, size, segs, validator, cancel, hasher=None):
+        self.url, self.part, self.size = url, part, size
+        # bytes written right at the hash cursor are hashed on the way to disk;
+        # whatever other connections wrote ahead of it is read back at the end
+        self.hasher, self.hash_pos = hasher, 0
+        self.segs = [[p, e, False] for p, e in segs if p < e]
+        self.validator = validator
+        self.cancel = cancel if cancel is not None else threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.failed = False
+        self.error = None  # the last segment error, for the caller to judge
+        self.fallback = False
+        self.etag = self.last_modified = None
+
+    def remaining(self):
+        with self.lock: return sum(max(0, e - p) for p, e, _ in self.segs)
+
+    def snapshot(self):
+        with self.lock: return [[p, e] for p, e, _ in self.segs if p < e]
+
+    def _claim(self):
+        # caller holds self.lock
+        for seg in self.segs:
+            if not seg[2] and seg[0] < seg[1]:
+                seg[2] = True
+                return seg
+        big = max(self.segs, key=lambda sg: sg[1] - sg[0], default=None)
+        if big is None or big[1] - big[0] < SEGMENT_MIN_SPLIT * 2: return None
+        mid = big[0] + (big[1] - big[0]) // 2
+        seg = [mid, big[1], True]
+        big[1] = mid
+        self.segs.append(seg)
+        return seg
+
+    def _fetch(self, seg, buf):
+        headers = dict(HEADERS)
+        headers['Range'] = f"bytes={seg[0]}-{seg[1]-1}"
+        if self.validator: headers['If-Range'] = self.validator
+        with HTTP.request(self.url, headers, timeout=30) as r:
+            range_start, range_total = parse_content_range(r.getheader('Content-Range'))
+            if r.status != 206 or range_start != seg[0] or (range_total and range_total != self.size):
+                self.fallback = True
+                return
+            if self.etag is None and self.last_modified is None:
+                self.etag, self.last_modified = r.getheader('ETag'), r.getheader('Last-Modified')
+            t_read = t_write = 0.0
+            got = 0
+            try:
+                while not self.cancel.is_set() and not self.fallback:
+                    with self.lock: want = seg[1] - seg[0]
+                    if want <= 0: break
+                    t0 = time.perf_counter()
+                    n = r.readinto(buf[:min(LIMITER.block(len(buf)), want)])
+                    t1 = time.perf_counter()
+                    if not n: raise IOError("Connection closed early")
+                    chunk = buf[:n]
+                    self.writer.write_at(seg[0], chunk)
+                    t_read, t_write = t_read + t1 - t0, t_write + time.perf_counter() - t1
+                    got += n
+                    with self.lock:
+                        if self.hasher and seg[0] == self.hash_pos:
+                            self.hasher.update(chunk)
+                            self.hash_pos += n
+                        seg[0] += n
+                    LIMITER.take(n, self.cancel)
+            finally: record_transfer(got, t_read, t_write)
+
+    def _worker(self):
+        errors = 0
+        buf = memoryview(bytearray(SEGMENT_BLOCK))
+        try:
+            while not self.cancel.is_set() and not self.fallback and not self.failed:
+                with self.lock: seg = self._claim()
+                if seg is None: return
+                try:
+                    self._fetch(seg, buf)
+                    errors = 0
+                except Exception as e:
+                    errors += 1
+                    log(f"Segment {seg[0]}-{seg[1]} error ({errors}): {e}")
+                    self.error = e
+                    if errors >= 3: self.failed = True
+                    else: time.sleep(errors)
+                finally:
+                    with self.lock: seg[2] = False
+        except Exception as e:
+            log(f"Segment worker failed: {e}")
+            self.failed = True
+
+    def _spawn(self):
+        t = threading.Thread(target=self._worker, daemon=True)
+        t.start()
+        self.threads.append(t)
+
+    def run(self, max_conns, progress=None, checkpoint=None):
+        start_time = time.time()
+        start_done = self.size - self.remaining()
+        # two blocks per connection, written at each segment's offset
+        self.writer = CardWriter(self.part, self.size, buffers=2 * max_conns, block=SEGMENT_BLOCK)
+        try: self._run(max_conns, progress, checkpoint, start_time, start_done)
+        finally: self.writer.close()
+
+    def _run(self, max_conns, progress, checkpoint, start_time, start_done):
+        for _ in range(min(2, max_conns)): self._spawn()
+        sample_time, sample_done, last_rate, growing = start_time, start_done, 0, True
+        meter = TransferMeter(start_done)
+        while any(t.is_alive() for t in self.threads):
+            time.sleep(0.25)
+            now = time.time()
+            done = self.size - self.remaining()
+            if progress and meter.update(done): progress(done, self.size, meter.speed)
+            if now - sample_time >= 2:
+                # keep adding connections while each one still buys >15% more throughput
+                rate = (done - sample_done) / (now - sample_time)
+                alive = sum(1 for t in self.threads if t.is_alive())
+                if growing and alive < max_conns and not self.cancel.is_set():
+                    if rate > last_rate * 1.15: self._spawn()
+                    else: growing = False
+                sample_time, sample_done, last_rate = now, done, rate
+                if checkpoint: checkpoint()
+        if checkpoint: checkpoint()
+        done = self.size - self.remaining()
+        if progress: progress(done, self.size, meter.speed or (done - start_done) / max(0.001, time.time() - start_time))
 
-def download_file(stdscr, base_url, filename, folder, file_size_total):
+def hash_range(path, hasher, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            block = f.read(min(1 << 20, left))
+            if not block: break
+            hasher.update(block)
+            left -= len(block)
+
+def hash_mismatch(dest, part, hasher, md5):
+    if hasher is None or hasher.hexdigest() == md5.lower(): return False
+    log(f"MD5 mismatch: {dest}")
+    save_part_info(dest, None)
+    if os.path.exists(part): os.remove(part)
+    return True
+
+def record_transfer(nbytes, t_read, t_write):
+    if not nbytes: return
+    PROFILE.add("dl.read", t_read)
+    PROFILE.add("dl.write", t_write)
+    PROFILE.count("dl.bytes", nbytes)
+
+def receive(r, write, done, total, progress=None, cancel=None, hasher=None):
+    # Copies the response body to write() through one reused buffer. Reads
+    # grow from BLOCK_MIN as the measured speed allows. Returns the new `done`.
+    buf = memoryview(bytearray(BLOCK_MAX))
+    blk = LIMITER.block(BLOCK_MIN)
+    meter = TransferMeter(done)
+    start, t_read, t_write = done, 0.0, 0.0
+    start_time = time.monotonic()
+    if progress: progress(done, total, 0)
+    try:
+        while cancel is None or not cancel.is_set():
+            t0 = time.perf_counter()
+            n = r.readinto(buf[:blk])
+            t1 = time.perf_counter()
+            if not n: break
+            chunk = buf[:n]
+            write(chunk)
+            if hasher: hasher.update(chunk)
+            t_read, t_write = t_read + t1 - t0, t_write + time.perf_counter() - t1
+            done += n
+            LIMITER.take(n, cancel)
+            if n == blk and blk < BLOCK_MAX: blk = LIMITER.block(blk * 2)  # data is waiting, ask for more
+            if meter.update(done):
+                blk = next_block(meter.speed)
+                if progress: progress(done, total, meter.speed)
+    finally: record_transfer(done - start, t_read, t_write)
+    if progress: progress(done, total, meter.speed or (done - start) / max(0.001, time.monotonic() - start_time))
+    return done
+
+# --- DATA NODES ---
+# The item metadata names the data nodes holding the item (d1, d2, server)
+# and its directory there. Downloads go straight to the node that answered
+# a small ranged probe fastest instead of through archive.org's redirect;
+# mirrors.json remembers that choice per item for NODE_TTL. A node that
+# fails is skipped for NODE_TTL and the download falls back to the redirect.
+NODE_TTL = 24 * 3600
+NODE_PROBE_BYTES = 64 * 1024
+NODE_PROBE_TIMEOUT = 5
+NODES_LOCK = threading.Lock()
+
+def load_node_info(ident):
+    with NODES_LOCK:
+        try:
+            with open(NODES_FILE, "r") as f: return json.load(f).get(ident)
+        except: return None
+
+def update_node_info(ident, change):
+    with NODES_LOCK:
+        try:
+            with open(NODES_FILE, "r") as f: data = json.load(f)
+        except: data = {}
+        info = change(data.get(ident))
+        if info is None: data.pop(ident, None)
+        else: data[ident] = info
+        try:
+            tmp = NODES_FILE + ".tmp"
+            with open(tmp, "w") as f: json.dump(data, f)
+            os.replace(tmp, NODES_FILE)
+        except Exception as e: log(f"Node state save failed: {e}")
+
+def save_node_info(ident, fields):
+    hosts = []
+    for k in ('d1', 'd2', 'server'):
+        if fields.get(k) and fields[k] not in hosts: hosts.append(fields[k])
+    if not hosts or not fields.get('dir'): return
+    def change(info):
+        # a moved item keeps nothing of what was learned about its old nodes
+        if info and info.get('hosts') == hosts and info.get('dir') == fields['dir']: return info
+        return {'hosts': hosts, 'dir': fields['dir'], 'best': None, 'probed': 0, 'failed': {}}
+    update_node_info(ident, change)
+
+def node_url(host, info, safe_file):
+    scheme = urllib.parse.urlsplit(ARCHIVE_URL).scheme or "https"
+    return f"{scheme}://{host}{info['dir']}/{safe_file}"
+
+def probe_node(url, cancel=None):
+    # -> seconds to fetch the first NODE_PROBE_BYTES, or None
+    headers = dict(HEADERS)
+    headers['Range'] = f"bytes=0-{NODE_PROBE_BYTES - 1}"
+    t0 = time.time()
+    try:
+        with HTTP.request(url, headers, timeout=NODE_PROBE_TIMEOUT, retries=0) as r:
+            while r.read(65536):
+                if cancel is not None and cancel.is_set(): return None
+        return time.time() - t0
+    except Exception as e:
+        log(f"Probe failed: {url}: {e}")
+        return None
+
+def pick_node(ident, safe_file, cancel=None):
+    # -> (host, node info) to download from, or None for the redirect
+    info = load_node_info(ident)
+    if not info: return None
+    now = time.time()
+    if info.get('best') and now - info.get('probed', 0) < NODE_TTL: return info['best'], info
+    hosts = [h for h in info['hosts'] if now - info['failed'].get(h, 0) >= NODE_TTL]
+    if not hosts: return None
+    # all nodes are probed at once; the first to answer in full is the fastest
+    times, first = {}, threading.Event()
+    def probe(h):
+        times[h] = probe_node(node_url(h, info, safe_file), cancel)
+        if times[h] is not None or len(times) == len(hosts): first.set()
+    with PROFILE.span("dl.probe"):
+        for h in hosts: threading.Thread(target=probe, args=(h,), daemon=True).start()
+        first.wait(NODE_PROBE_TIMEOUT + 1)
+    times = dict(times)
+    ok = {h: t for h, t in times.items() if t is not None}
+    failed = [h for h in hosts if h in times and times[h] is None]
+    best = min(ok, key=ok.get) if ok else None
+    log(f"Nodes for {ident}: " + ", ".join(f"{h}={ok[h]*1000:.0f}ms" if h in ok else f"{h}={'failed' if h in failed else 'slower'}" for h in hosts))
+    def change(cur):
+        if not cur or cur['hosts'] != info['hosts']: return cur
+        cur['failed'].update({h: now for h in failed})
+        cur['best'], cur['probed'] = best, now
+        return cur
+    if cancel is None or not cancel.is_set(): update_node_info(ident, change)
+    return (best, info) if best else None
+
+def node_failed(ident, host):
+    def change(cur):
+        if not cur: return cur
+        cur['failed'][host] = time.time()
+        if cur.get('best') == host: cur['best'] = None
+        return cur
+    update_node_info(ident, change)
+
+def download_segmented(url, dest, part, size, max_conns, info, progress, cancel, md5=None, errors=None):
+    segs = info.get('segments')
+    if not (segs and os.path.exists(part)):
+        offset = os.path.getsize(part) if os.path.exists(part) and info.get('size') == size and not segs else 0
+        if offset > size: offset = 0
+        # a single-stream .part keeps its prefix; the rest is split between connections.
+        # The file is not grown to size first: FAT has no sparse files, so that
+        # would write zeros over all of it before the first byte. CardWriter
+        # reserves the space and each range is written at its offset.
+        if not offset: open(part, 'wb').close()
+        segs = [[offset, size]]
+        if not offset: info = {}
+    have = size - sum(e - p for p, e in segs)
+    hasher = hashlib.md5() if md5 else None
+    job = SegmentedDownload(url, part, size, segs, part_validator(info) if have else None, cancel, hasher)
+    def checkpoint():
+        # only ranges already on the card are recorded as done
+        segs = job.snapshot()
+        job.writer.sync()
+        save_part_info(dest, {'url': url, 'etag': job.etag or info.get('etag'), 'last_modified': job.last_modified or info.get('last_modified'), 'size': size, 'segments': segs})
+    job.run(max_conns, progress, checkpoint)
+    if job.fallback: return None
+    if job.cancel.is_set(): return False, "CANCELLED"
+    if job.remaining() > 0:
+        if errors is not None and job.error: errors.append(job.error)
+        return False, "DL Error"
+    if hasher: hash_range(part, hasher, job.hash_pos, size)
+    if hash_mismatch(dest, part, hasher, md5): return False, "MD5 Mismatch"
+    finalize(part, dest)
+    save_part_info(dest, None)
+    return True, "Saved!"
+
+def download_file(base_url, filename, folder, file_size_total, progress=None, cancel=None, segments=0, md5=None, extract=False):
     clean_name = os.path.basename(urllib.parse.unquote(filename))
     dest = os.path.join(STORAGE_ROOT, folder, clean_name)
     if not os.path.exists(os.path.dirname(dest)): 
         try: os.makedirs(os.path.dirname(dest))
         except: return False, "Write Error"
     
-    if filename.startswith("http"): url = filename
-    else:
-        safe_file = filename.replace(" ", "%20")
-        url = f"https://archive.org/download/{base_url}/{safe_file}"
+    if filename.startswith("http"): return download_url(filename, dest, file_size_total, progress, cancel, segments, md5, extract)
+    safe_file = filename.replace(" ", "%20")
+    redirect = f"{ARCHIVE_URL}/download/{base_url}/{safe_file}"
+    node = pick_node(base_url, safe_file, cancel) if base_url else None
+    if not node: return download_url(redirect, dest, file_size_total, progress, cancel, segments, md5, extract)
+    host, info = node
+    errors = []
+    ok, msg = download_url(node_url(host, info, safe_file), dest, file_size_total, progress, cancel, segments, md5, extract, errors)
+    # only a transfer failure is worth another try through the redirect
+    if ok or msg != "DL Error": return ok, msg
+    log(f"Node {host} failed, using redirect: {clean_name}")
+    ok, msg = download_url(redirect, dest, file_size_total, progress, cancel, segments, md5, extract)
+    # the node is only to blame if it failed in its own way and the redirect then worked;
+    # a dropped Wi-Fi or a full card fails both
+    if ok and any(node_fault(e) for e in errors): node_failed(base_url, host)
+    return ok, msg
 
-    req = urllib.request.Request(url, headers=HEADERS)
-    h, w = stdscr.getmaxyx()
-    box_y, box_x = h//2 - 5, w//2 - 25
-    
-    for y in range(box_y, box_y+8): safe_addstr(stdscr, y, box_x, " " * 50, 1)
-    safe_addstr(stdscr, box_y, box_x, "+" + "-"*48 + "+", 3)
-    safe_addstr(stdscr, box_y+7, box_x, "+" + "-"*48 + "+", 3)
-    for y in range(box_y+1, box_y+7):
-        safe_addstr(stdscr, y, box_x, "|", 3)
-        safe_addstr(stdscr, y, box_x+49, "|", 3)
-    
-    safe_addstr(stdscr, box_y+1, box_x+2, "DOWNLOADING...", 3)
-    safe_addstr(stdscr, box_y+2, box_x+2, safe_str(clean_name)[:46], 1)
-    
-    start_time = time.time()
-    total_size = float(file_size_total) if file_size_total else 0
+def node_fault(e):
+    # errors the data node answers for, not the card or the local network
+    import socket
+    if isinstance(e, HTTPError): return 400 <= e.code < 600
+    return isinstance(e, (ConnectionError, TimeoutError, socket.timeout, TransientStatus))
+
+def download_url(url, dest, file_size_total, progress=None, cancel=None, segments=0, md5=None, extract=False, errors=None):
+    clean_name = os.path.basename(dest)
+    part = dest + ".part"
+    expected = int(float(file_size_total)) if file_size_total else 0
+    if extract and clean_name.lower().endswith('.zip'): return download_extract(url, dest, expected, progress, cancel, md5)
+    info = load_part_info(dest) or {}
+    if info.get('size') and expected and info['size'] != expected:
+        # the metadata changed since the .part was started, so its bytes are useless
+        info = {}
+        save_part_info(dest, None)
+        if os.path.exists(part): os.remove(part)
+
+    # segmented mode is opt-in per collection; a .part left by it must be finished the same way
+    if expected and (info.get('segments') or (segments > 1 and expected >= SEGMENT_MIN_SIZE)):
+        try:
+            result = download_segmented(url, dest, part, expected, max(2, segments), info, progress, cancel, md5, errors)
+            if result is not None: return result
+        except Exception as e:
+            log(f"Segmented DL Error: {clean_name}: {e}")
+            if errors is not None: errors.append(e)
+            return False, "DL Error"
+        log(f"Range not supported, single stream: {clean_name}")
+        info = {}
+        save_part_info(dest, None)
+        if os.path.exists(part): os.remove(part)
+
+    offset = os.path.getsize(part) if os.path.exists(part) and not info.get('segments') else 0
+    if offset and expected and offset > expected: offset = 0
+
+    headers = dict(HEADERS)
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+        validator = part_validator(info)
+        if validator: headers['If-Range'] = validator
+    total_size = float(expected)
     
     try:
-        with urllib.request.urlopen(req) as r, open(dest, 'wb') as f:
+        try: r = HTTP.request(url, headers, timeout=30)
+        except HTTPError as e:
+            # 416: the .part already holds the whole file
+            if e.code == 416 and offset and (not expected or offset == expected):
+                hasher = hashlib.md5() if md5 else None
+                if hasher: hash_range(part, hasher, 0, offset)
+                if hash_mismatch(dest, part, hasher, md5): return False, "MD5 Mismatch"
+                finalize(part, dest)
+                save_part_info(dest, None)
+                return True, "Saved!"
+            if e.code == 416:
+                save_part_info(dest, None)
+                if os.path.exists(part): os.remove(part)
+            raise
+        with r:
+            if offset:
+                range_start, range_total = parse_content_range(r.getheader('Content-Range'))
+                if r.status != 206 or range_start != offset:
+                    log(f"Range ignored, restarting: {clean_name}")
+                    offset = 0
+                elif range_total and not total_size: total_size = float(range_total)
             if total_size == 0:
                  hdr_size = r.getheader('Content-Length')
-                 if hdr_size: total_size = float(hdr_size)
-            downloaded = 0
-            blk = 8192
-            while True:
-                 if input_state['B']: return False, "CANCELLED"
-                 chunk = r.read(blk)
-                 if not chunk: break
-                 f.write(chunk)
-                 downloaded += len(chunk)
-                 
-                 cur_time = time.time()
-                 elapsed = cur_time - start_time
-                 speed = downloaded / elapsed if elapsed > 0 else 0
-                 
-                 if total_size > 0:
-                     pct = min(1.0, downloaded / total_size)
-                     filled = int(46 * pct)
-                     safe_addstr(stdscr, box_y+4, box_x+2, "#" * filled, 2)
-                     stat_str = f"{int(pct*100)}% | {format_size(speed)}/s"
-                     safe_addstr(stdscr, box_y+5, box_x+2, stat_str.center(46), 1)
-                 else:
-                     safe_addstr(stdscr, box_y+5, box_x+2, f"{format_size(downloaded)} | {format_size(speed)}/s", 1)
-                 stdscr.refresh()
-        if input_state['B']: 
-             os.remove(dest)
-             return False, "CANCELLED"
+                 if hdr_size: total_size = float(hdr_size) + offset
+            save_part_info(dest, {'url': url, 'etag': r.getheader('ETag'), 'last_modified': r.getheader('Last-Modified'), 'size': expected or int(total_size)})
+            hasher = hashlib.md5() if md5 else None
+            if hasher and offset: hash_range(part, hasher, 0, offset)  # resuming: the kept prefix is read once
+            writer = CardWriter(part, expected or int(total_size), offset, fresh=not offset)
+            try: downloaded = receive(r, writer.write, offset, total_size, progress, cancel, hasher)
+            finally: writer.close()
+        if cancel is not None and cancel.is_set(): return False, "CANCELLED"
+        if total_size and downloaded < total_size: return False, "DL Error"
+        if hash_mismatch(dest, part, hasher, md5): return False, "MD5 Mismatch"
+        finalize(part, dest)
+        save_part_info(dest, None)
         return True, "Saved!"
     except Exception as e:
-        if os.path.exists(dest): os.remove(dest)
+        log(f"DL Error: {clean_name}: {e}")
+        if errors is not None: errors.append(e)
         return False, "DL Error"
 
+# --- ZIP EXTRACTION ---
+# Unpacks a .zip while it downloads, so the archive itself never lands on the
+# card. Members are taken from their local headers in stream order. Only a
+# stored member with a data descriptor has no length before its data; from
+# there the rest of the stream is spooled to disk and finished using the
+# central directory at the end.
+ZIP_LOCAL = struct.Struct('<IHHHHHIIIHH')
+ZIP_CENTRAL = struct.Struct('<IHHHHHHIIIHHHHHII')
+ZIP_EOCD = struct.Struct('<IHHHHIIH')
+ZIP64_LOCATOR = struct.Struct('<IIQI')
+ZIP64_EOCD = struct.Struct('<IQHHIIQQQQ')
+SIG_LOCAL, SIG_CENTRAL, SIG_DESCRIPTOR, SIG_EOCD = 0x04034b50, 0x02014b50, 0x08074b50, 0x06054b50
+SIG_ZIP64_EOCD, SIG_ZIP64_LOCATOR = 0x06064b50, 0x07064b50
+
+class ZipError(Exception): pass
+
+def zip64_fields(extra, values):
+    # the zip64 extra field (0x0001) holds, in order, only the values whose 32-bit field is 0xFFFFFFFF
+    values, pos = list(values), 0
+    while pos + 4 <= len(extra):
+        tag, ln = struct.unpack_from('<HH', extra, pos)
+        if tag == 1:
+            off, end = pos + 4, pos + 4 + ln
+            for i, v in enumerate(values):
+                if v == 0xFFFFFFFF and off + 8 <= end:
+                    values[i] = struct.unpack_from('<Q', extra, off)[0]
+                    off += 8
+            return values, True
+        pos += 4 + ln
+    return values, False
+
+def member_path(root, name):
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts or ':' in parts[0]: return None
+    return os.path.join(root, *parts)
+
+class ZipStreamExtractor:
+    def __init__(self, root, spool_path):
+        self.root, self.spool_path = root, spool_path
+        self.buf = bytearray()
+        self.pos = 0  # archive offset of buf[0]
+        self.state = 'header'
+        self.member = self.out = None
+        self.spool = None
+        self.done = False
+        self.written = []
+
+    def feed(self, data):
+        if self.spool is not None: self.spool.write(data)
+        elif not self.done:
+            self.buf += data
+            while self._step(): pass
+
+    def _take(self, n):
+        chunk = bytes(self.buf[:n])
+        del self.buf[:n]
+        self.pos += n
+        return chunk
+
+    def _step(self):
+        if self.state == 'data': return self._data()
+        if self.state == 'descriptor': return self._descriptor()
+        if len(self.buf) < 4: return False
+        sig = struct.unpack_from('<I', self.buf)[0]
+        if sig in (SIG_CENTRAL, SIG_EOCD, SIG_ZIP64_EOCD):
+            # every member has been seen; the directory itself is not needed
+            self.done = True
+            self.buf = bytearray()
+            return False
+        if sig != SIG_LOCAL: raise ZipError("Not a zip stream")
+        if len(self.buf) < ZIP_LOCAL.size: return False
+        _, _, flags, method, _, _, crc, csize, usize, nlen, xlen = ZIP_LOCAL.unpack_from(self.buf)
+        if len(self.buf) < ZIP_LOCAL.size + nlen + xlen: return False
+        offset = self.pos
+        head = self._take(ZIP_LOCAL.size + nlen + xlen)
+        extra = head[ZIP_LOCAL.size + nlen:]
+        (usize, csize), zip64 = zip64_fields(extra, (usize, csize))
+        if flags & 8 and method == 0:
+            self._start_spool(offset)
+            return False
+        self._begin(head[ZIP_LOCAL.size:ZIP_LOCAL.size + nlen], flags, method, crc, csize, zip64)
+        self.state = 'data'
+        return True
+
+    def _begin(self, name_raw, flags, method, crc, csize, zip64):
+        if flags & 1: raise ZipError("Encrypted zip")
+        if method not in (0, 8): raise ZipError(f"Unsupported zip method {method}")
+        name = name_raw.decode('utf-8' if flags & 0x800 else 'cp437', 'replace')
+        path = member_path(self.root, name)
+        self.member = {'name': name, 'path': path, 'crc': crc, 'left': csize, 'stream': bool(flags & 8), 'zip64': zip64,
+                       'calc': 0, 'z': zlib.decompressobj(-15) if method == 8 else None}
+        if path is None: log(f"Zip member skipped: {name}")
+        elif name.endswith('/'):
+            os.makedirs(path, exist_ok=True)
+            self.member['path'] = None
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.out = open(self.member_tmp(path), "wb")
+
+    def member_tmp(self, path):
+        # unique per archive, in case two archives in the queue hold the same member name
+        return f"{path}.{id(self) & 0xFFFFFF:06x}.part"
+
+    def _write(self, data):
+        if not data: return
+        self.member['calc'] = zlib.crc32(data, self.member['calc'])
+        if self.out: self.out.write(data)
+
+    def _inflate(self, z, data):
+        while data:
+            self._write(z.decompress(data, 1 << 20))  # bounded, however well the member compresses
+            data = z.unconsumed_tail
+
+    def _data(self):
+        m = self.member
+        if m['stream']:
+            # deflate with a data descriptor: the deflate stream marks its own end
+            if not self.buf: return False
+            self._inflate(m['z'], self._take(len(self.buf)))
+            if m['z'].eof:
+                rest = m['z'].unused_data
+                self.buf[0:0] = rest
+                self.pos -= len(rest)
+                self.state = 'descriptor'
+            return True
+        if m['left']:
+            if not self.buf: return False
+            chunk = self._take(min(m['left'], len(self.buf)))
+            m['left'] -= len(chunk)
+            if m['z']: self._inflate(m['z'], chunk)
+            else: self._write(chunk)
+            if m['left']: return True
+        if m['z']: self._write(m['z'].flush())
+        self._finish_member(m['crc'])
+        self.state = 'header'
+        return True
+
+    def _descriptor(self):
+        if len(self.buf) < 4: return False
+        signed = struct.unpack_from('<I', self.buf)[0] == SIG_DESCRIPTOR
+        need = (4 if signed else 0) + 4 + (16 if self.member['zip64'] else 8)
+        if len(self.buf) < need: return False
+        crc = struct.unpack_from('<I', self._take(need), 4 if signed else 0)[0]
+        self._finish_member(crc)
+        self.state = 'header'
+        return True
+
+    def _finish_member(self, crc):
+        m, self.member = self.member, None
+        if not self.out: return
+        self.out.close()
+        self.out = None
+        if m['calc'] != crc:
+            os.remove(self.member_tmp(m['path']))
+            raise ZipError(f"CRC mismatch: {m['name']}")
+        os.replace(self.member_tmp(m['path']), m['path'])
+        self.written.append(m['path'])
+
+    def _start_spool(self, member_offset):
+        self.spool_member, self.spool_start = member_offset, self.pos
+        self.spool = open(self.spool_path, "w+b")
+        self.spool.write(self.buf)
+        self.pos += len(self.buf)
+        self.buf = bytearray()
+
+    def finish(self):
+        if self.spool is not None: self._finish_spool()
+        elif not self.done: raise ZipError("Archive ended early")
+
+    def _central_directory(self, f):
+        size = f.seek(0, 2)
+        tail_len = min(size, 65536 + ZIP_EOCD.size)
+        f.seek(size - tail_len)
+        tail = f.read(tail_len)
+        i = tail.rfind(struct.pack('<I', SIG_EOCD))
+        if i < 0: raise ZipError("No central directory")
+        _, _, _, _, count, cd_size, cd_off, _ = ZIP_EOCD.unpack_from(tail, i)
+        if count == 0xFFFF or cd_size == 0xFFFFFFFF or cd_off == 0xFFFFFFFF:
+            j = tail.rfind(struct.pack('<I', SIG_ZIP64_LOCATOR), 0, i)
+            if j < 0: raise ZipError("No zip64 directory")
+            f.seek(ZIP64_LOCATOR.unpack_from(tail, j)[2] - self.spool_start)
+            rec = ZIP64_EOCD.unpack(f.read(ZIP64_EOCD.size))
+            count, cd_size, cd_off = rec[7], rec[8], rec[9]
+        f.seek(cd_off - self.spool_start)
+        return f.read(cd_size), count
+
+    def _finish_spool(self):
+        f = self.spool
+        f.flush()
+        cd, count = self._central_directory(f)
+        pos = 0
+        for _ in range(count):
+            (_, _, _, flags, method, _, _, crc, csize, usize, nlen, xlen, clen, _, _, _, lho) = ZIP_CENTRAL.unpack_from(cd, pos)
+            name_raw = cd[pos + ZIP_CENTRAL.size:pos + ZIP_CENTRAL.size + nlen]
+            extra = cd[pos + ZIP_CENTRAL.size + nlen:pos + ZIP_CENTRAL.size + nlen + xlen]
+            pos += ZIP_CENTRAL.size + nlen + xlen + clen
+            (usize, csize, lho), zip64 = zip64_fields(extra, (usize, csize, lho))
+            if lho < self.spool_member: continue  # extracted while streaming
+            if lho == self.spool_member: data_off = 0
+            else:
+                f.seek(lho - self.spool_start)
+                local = ZIP_LOCAL.unpack(f.read(ZIP_LOCAL.size))
+                data_off = lho - self.spool_start + ZIP_LOCAL.size + local[9] + local[10]
+            self._begin(name_raw, flags & ~8, method, crc, csize, zip64)
+            f.seek(data_off)
+            left, z = csize, self.member['z']
+            while left:
+                chunk = f.read(min(1 << 20, left))
+                if not chunk: raise ZipError("Archive ended early")
+                left -= len(chunk)
+                if z: self._inflate(z, chunk)
+                else: self._write(chunk)
+            if z: self._write(z.flush())
+            self._finish_member(crc)
+        self.close()
+
+    def close(self):
+        if self.out:
+            self.out.close()
+            self.out = None
+            try: os.remove(self.member_tmp(self.member['path']))
+            except OSError: pass
+        if self.spool:
+            self.spool.close()
+            self.spool = None
+            try: os.remove(self.spool_path)
+            except OSError: pass
+
+    def abort(self):
+        # a failed or cancelled archive leaves nothing half done behind
+        self.close()
+        for path in self.written:
+            try: os.remove(path)
+            except OSError: pass
+        self.written = []
+
+def download_extract(url, dest, expected, progress, cancel, md5):
+    root = os.path.dirname(dest)
+    z = ZipStreamExtractor(root, os.path.join(root, f".{os.path.basename(dest)}.spool"))
+    hasher = hashlib.md5() if md5 else None
+    try:
+        with HTTP.request(url, dict(HEADERS), timeout=30) as r:
+            total = float(expected or r.getheader('Content-Length') or 0)
+            done = receive(r, z.feed, 0, total, progress, cancel, hasher)
+        if cancel is not None and cancel.is_set():
+            z.abort()
+            return False, "CANCELLED"
+        if total and done < total: raise ZipError("Download ended early")
+        if hasher and hasher.hexdigest() != md5.lower(): raise ZipError("MD5 mismatch")
+        z.finish()
+    except Exception as e:
+        z.abort()
+        log(f"Extract Error: {dest}: {e}")
+        return False, "Extract Error"
+    save_sync_records({dest: {'md5': md5.lower() if md5 else None, 'extracted': z.written}})
+    log(f"Extracted {len(z.written)} files: {dest}")
+    return True, f"Extracted {len(z.written)}"
+
+# --- DOWNLOAD QUEUE ---
+class DownloadJob:
+    def __init__(self, ident, name, folder, size, status="QUEUED", msg="", segments=0, md5=None, extract=False):
+        self.ident, self.name, self.folder, self.size = ident, name, folder, size
+        self.segments, self.md5, self.extract = segments, md5, extract
+        self.status, self.msg = status, msg
+        self.done, self.total, self.speed = 0, float(size) if size else 0, 0
+        self.cancel = threading.Event()
+
+    def key(self): return (self.ident, self.name, self.folder)
+
+    def label(self): return safe_str(os.path.basename(urllib.parse.unquote(self.name)))
+
+    def dest(self): return os.path.join(STORAGE_ROOT, self.folder, os.path.basename(urllib.parse.unquote(self.name)))
+
+    def to_dict(self):
+        return {'ident': self.ident, 'name': self.name, 'folder': self.folder, 'size': self.size, 'status': self.status, 'msg': self.msg, 'segments': self.segments, 'md5': self.md5, 'extract': self.extract}
+
+    @classmethod
+    def from_dict(cls, d):
+        status = d.get('status', 'QUEUED')
+        if status == "ACTIVE": status = "QUEUED"  # interrupted by exit, pick it up again
+        return cls(d.get('ident'), d['name'], d.get('folder', 'roms'), d.get('size'), status, d.get('msg', ''), d.get('segments', 0), d.get('md5'), d.get('extract', False))
+
+class DownloadQueue:
+    def __init__(self, path=QUEUE_FILE, workers=DOWNLOAD_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.threads = []
+        self.version = 0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r") as f: data = json.load(f)
+            with self.lock:
+                self.jobs = [DownloadJob.from_dict(d) for d in data]
+                self.version += 1
+        except Exception as e: log(f"Queue load failed: {e}")
+
+    def save(self):
+        # caller holds self.lock
+        self.version += 1
+        if not self.path: return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f: json.dump([j.to_dict() for j in self.jobs], f)
+            os.replace(tmp, self.path)
+        except Exception as e: log(f"Queue save failed: {e}")
+
+    def start(self):
+        while len(self.threads) < self.workers:
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def add(self, ident, name, folder, size, segments=0, md5=None, extract=False):
+        with self.lock:
+            job = DownloadJob(ident, name, folder, size, segments=segments, md5=md5, extract=extract)
+            for j in self.jobs:
+                if j.key() == job.key() and j.status in ("QUEUED", "ACTIVE"): return False
+            self.jobs.append(job)
+            self.save()
+            self.wake.notify()
+        return True
+
+    def cancel(self, job):
+        with self.lock:
+            if job.status == "QUEUED":
+                job.status, job.msg = "CANCELLED", "CANCELLED"
+                self.save()
+            elif job.status == "ACTIVE": job.cancel.set()
+
+    def retry(self, job):
+        with self.lock:
+            if job.status not in ("FAILED", "CANCELLED"): return
+            job.status, job.msg, job.done, job.speed = "QUEUED", "", 0, 0
+            job.cancel.clear()
+            self.save()
+            self.wake.notify()
+
+    def clear_finished(self):
+        with self.lock:
+            self.jobs = [j for j in self.jobs if j.status in ("QUEUED", "ACTIVE")]
+            self.save()
+
+    def counts(self):
+        with self.lock:
+            active = sum(1 for j in self.jobs if j.status == "ACTIVE")
+            queued = sum(1 for j in self.jobs if j.status == "QUEUED")
+        return active, queued
+
+    def _next_job(self):
+        with self.lock:
+            while True:
+                for j in self.jobs:
+                    if j.status == "QUEUED":
+                        j.status, j.done, j.speed = "ACTIVE", 0, 0
+                        self.save()
+                        return j
+                self.wake.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            def progress(done, total, speed):
+                job.done, job.total, job.speed = done, total, speed
+            try: success, msg = download_file(job.ident, job.name, job.folder, job.size, progress, job.cancel, job.segments, job.md5, job.extract)
+            except Exception as e: success, msg = False, "DL Error"
+            if success and job.md5: save_sync_records({job.dest(): sync_record(job.dest(), job.md5)})
+            with self.lock:
+                if success: job.status = "DONE"
+                elif msg == "CANCELLED": job.status = "CANCELLED"
+                else: job.status = "FAILED"
+                job.msg = msg
+                job.cancel.clear()
+                self.save()
+            log(f"Queue: {job.label()} -> {msg}")
+
+DOWNLOADS = DownloadQueue()
+
+def enqueue_item(dl_queue, sys_data, item):
+    if sys_data[1] == "API": return dl_queue.add(sys_data[2], item['name'], sys_data[4], item['size'], sys_data[6], item.get('md5'), sys_data[8])
+    return dl_queue.add(None, item['name'], sys_data[4], None, extract=sys_data[8])
+
+# --- SYNC ---
+# sync.json remembers files already checked against the metadata:
+# dest -> {size, mtime, md5}. A file whose size and mtime still match its
+# record, and whose md5 is still the one in the metadata, is not read again.
+SYNC_LOCK = threading.Lock()
+
+def load_sync_state():
+    with SYNC_LOCK:
+        try:
+            with open(SYNC_FILE, "r") as f: return json.load(f)
+        except: return {}
+
+def save_sync_records(records):
+    with SYNC_LOCK:
+        try:
+            with open(SYNC_FILE, "r") as f: data = json.load(f)
+        except: data = {}
+        data.update({k: v for k, v in records.items() if v})
+        try:
+            tmp = SYNC_FILE + ".tmp"
+            with open(tmp, "w") as f: json.dump(data, f)
+            os.replace(tmp, SYNC_FILE)
+        except Exception as e: log(f"Sync state save failed: {e}")
+
+def sync_record(dest, md5):
+    try: st = os.stat(dest)
+    except OSError: return None
+    return {'size': st.st_size, 'mtime': st.st_mtime, 'md5': md5}
+
+def file_md5(path, cancel=None):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        while True:
+            if cancel is not None and cancel.is_set(): return None
+            block = f.read(1 << 20)
+            if not block: break
+            h.update(block)
+    return h.hexdigest()
+
+def fetch_for_sync(sys_data):
+    # always ask the server, but let an unchanged list come back as a 304;
+    # lists cached before md5s were stored are fetched in full
+    cached = load_cache(sys_data[0])
+    has_md5 = isinstance(cached, CachedList) and cached.version >= 2
+    files, err = fetch_collection(sys_data, True, load_cache_meta(sys_data[0]) if has_md5 else None)
+    if not files and cached: return cached, None
+    return files, err
+
+def sync_plan(sys_data, files, progress=None, cancel=None):
+    # -> (items missing or different on the card, number already in sync)
+    state = load_sync_state()
+    todo, ok, verified = [], 0, {}
+    for n, item in enumerate(files):
+        if cancel is not None and cancel.is_set(): break
+        if progress: progress(n, len(files))
+        dest = item_dest(sys_data, item)
+        if sys_data[8] and dest.lower().endswith('.zip'):
+            # extracted archives are never on the card; their record lists what came out of them
+            rec = state.get(dest)
+            md5 = (item.get('md5') or "").lower()
+            if rec and rec.get('extracted') and (not md5 or rec.get('md5') == md5) and all(os.path.exists(p) for p in rec['extracted']): ok += 1
+            else: todo.append(item)
+            continue
+        try: st = os.stat(dest)
+        except OSError:
+            todo.append(item)
+            continue
+        try: size = int(float(item['size'])) if item.get('size') is not None else None
+        except: size = None
+        md5 = (item.get('md5') or "").lower()
+        if not md5: ok += 1  # HTML listings carry no hashes and only rounded sizes
+        elif size is not None and st.st_size != size: todo.append(item)
+        else:
+            rec = state.get(dest)
+            if rec and rec.get('size') == st.st_size and rec.get('mtime') == st.st_mtime and rec.get('md5') == md5:
+                ok += 1
+                continue
+            # on the card from before, or touched since: hash it once
+            got = file_md5(dest, cancel)
+            if got is None: break
+            if got == md5:
+                verified[dest] = {'size': st.st_size, 'mtime': st.st_mtime, 'md5': md5}
+                ok += 1
+            else: todo.append(item)
+    if verified: save_sync_records(verified)
+    return todo, ok
+
+class SyncRun:
+    # Sync of one collection in the background: diff the list against the
+    # card, then queue whatever is missing or different.
+    def __init__(self, sys_data, dl_queue):
+        self.sys_data, self.dl_queue = sys_data, dl_queue
+        self.status = "SYNC: CHECKING LIST"
+        self.done = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            files, err = fetch_for_sync(self.sys_data)
+            if not files:
+                self.status = f"SYNC FAILED: {err}"
+                return
+            def progress(n, total): self.status = f"SYNC: CHECKING {n}/{total}"
+            todo, ok = sync_plan(self.sys_data, files, progress)
+            added = sum(1 for item in todo if enqueue_item(self.dl_queue, self.sys_data, item))
+            self.status = f"SYNC: {ok} OK, {added} QUEUED"
+            log(f"Sync {self.sys_data[0]}: {ok} in sync, {len(todo)} to download, {added} queued")
+        except Exception as e:
+            log(f"Sync failed: {self.sys_data[0]}: {e}")
+            self.status = "SYNC FAILED"
+        finally: self.done = True
+
+# --- SEARCH ---
+class SearchIndex:
+    # Names are unquoted and lowercased once per list, by prebuild's thread
+    # or the first search that needs them. A longer term only re-checks the
+    # results of a shorter term it contains; otherwise the rarest trigram of
+    # the term picks the candidates.
+    HISTORY = 32
+
+    def __init__(self, items):
+        self.items = items
+        self._keys = None
+        self.keys_lock = threading.Lock()
+        self.grams = None
+        self.grams_lock = threading.Lock()
+        self.history = {}
+
+    @property
+    def keys(self):
+        if self._keys is None:
+            with self.keys_lock:
+                if self._keys is None:
+                    with PROFILE.span("search.keys"): self._keys = [urllib.parse.unquote(it['name']).lower() for it in self.items]
+        return self._keys
+
+    def prebuild(self):
+        threading.Thread(target=self._build_grams, daemon=True).start()
+
+    def _build_grams(self):
+        with self.grams_lock:
+            if self.grams is not None: return
+            t0 = time.perf_counter()
+            grams = {}
+            for i, k in enumerate(self.keys):
+                for g in {k[j:j+3] for j in range(len(k) - 2)}:
+                    lst = grams.get(g)
+                    if lst is None: grams[g] = array('I', (i,))
+                    else: lst.append(i)
+            self.grams = grams
+            PROFILE.add("search.grams", time.perf_counter() - t0)
+
+    def search(self, term):
+        with PROFILE.span("search"): return self._search(term)
+
+    def _search(self, term):
+        term = term.lower()
+        if not term: return range(len(self.items))
+        res = self.history.get(term)
+        if res is not None: return res
+        base = None
+        for t, prev in self.history.items():
+            if t in term and (base is None or len(prev) < len(base)): base = prev
+        if base is None and len(term) >= 3:
+            self._build_grams()
+            postings = [self.grams.get(term[j:j+3]) for j in range(len(term) - 2)]
+            base = () if None in postings else min(postings, key=len)
+        keys = self.keys
+        if base is None: res = [i for i, k in enumerate(keys) if term in k]
+        else: res = [i for i in base if term in keys[i]]
+        if len(self.history) >= self.HISTORY: self.history.pop(next(iter(self.history)))
+        self.history[term] = res
+        return res
+
+    def filter(self, term):
+        res = self.search(term)
+        if isinstance(res, range): return self.items
+        return [self.items[i] for i in res]
+
+# --- GLOBAL SEARCH ---
+class GlobalSearch:
+    # One SearchIndex per cached collection, rebuilt only when that
+    # collection's cache file changes. Counting matches per keystroke reuses
+    # each index's trigrams and history; ranking happens once, on confirm.
+    MAX_RESULTS = 2000
+
+    def __init__(self):
+        self.parts = {}  # collection name -> (cache stamp, sys_data, SearchIndex)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.progress = (0, 0)
+
+    def busy(self): return self.thread is not None and self.thread.is_alive()
+
+    def start(self, collections):
+        if self.busy(): return
+        self.thread = threading.Thread(target=self.refresh, args=(list(collections),), daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        if self.thread is not None: self.thread.join()
+
+    def refresh(self, collections):
+        with PROFILE.span("search.global_refresh"):
+            for n, sys_data in enumerate(collections):
+                self.progress = (n, len(collections))
+                stamp = cache_stamp(sys_data[0])
+                part = self.parts.get(sys_data[0])
+                if part and part[0] == stamp:
+                    if part[1] != sys_data:
+                        with self.lock: self.parts[sys_data[0]] = (stamp, sys_data, part[2])
+                    continue
+                files = read_cache(sys_data[0]) if stamp else None
+                if not files:
+                    with self.lock: self.parts.pop(sys_data[0], None)
+                    continue
+                index = SearchIndex(files)
+                index._build_grams()
+                with self.lock: self.parts[sys_data[0]] = (stamp, sys_data, index)
+            names = {sys_data[0] for sys_data in collections}
+            with self.lock:
+                for name in [k for k in self.parts if k not in names]: del self.parts[name]
+            self.progress = (len(collections), len(collections))
+
+    def count(self, term):
+        with self.lock: parts = list(self.parts.values())
+        return sum(len(index.search(term)) for _, _, index in parts)
+
+    def results(self, term):
+        # -> [(sys_data, item)], best first
+        term = term.lower()
+        with self.lock: parts = list(self.parts.values())
+        def scored():
+            for p, (_, _, index) in enumerate(parts):
+                keys = index.keys
+                for i in index.search(term):
+                    key = keys[i]
+                    base = key[key.rfind('/') + 1:]
+                    yield (match_rank(base, term), len(base), p, i)
+        best = heapq.nsmallest(self.MAX_RESULTS, scored())
+        return [(parts[p][1], parts[p][2].items[i]) for _, _, p, i in best]
+
+    def __len__(self):
+        with self.lock: return sum(len(index.keys) for _, _, index in self.parts.values())
+
+def match_rank(base, term):
+    # 0 whole name, 1 name starts with it, 2 a word starts with it, 3 inside the name, 4 only in the folder
+    i = base.find(term)
+    if i < 0: return 4
+    if i == 0: return 0 if base.rsplit('.', 1)[0] == term else 1
+    return 2 if not base[i - 1].isalnum() else 3
+
+GLOBAL_SEARCH = GlobalSearch()
+
 # --- UI HELPERS ---
 def calibrate(stdscr):
     if load_controls(): return
@@ -397,22 +2575,111 @@ def calibrate(stdscr):
     BTN_MAP = temp_map
     save_controls()
 
-def get_letter_jump(current_idx, items, direction):
-    if not items: return 0
-    current_char = safe_str(items[current_idx]['name'])[0].upper()
-    if direction == 1:
-        for i in range(current_idx + 1, len(items)):
-            if safe_str(items[i]['name'])[0].upper() != current_char: return i
-        return 0
-    else:
-        for i in range(current_idx, -1, -1):
-            char = safe_str(items[i]['name'])[0].upper()
-            if char != current_char:
-                prev_char = char
-                for j in range(i, -1, -1):
-                     if safe_str(items[j]['name'])[0].upper() != prev_char: return j + 1
-                return 0
-        return len(items) - 1
+def list_label(item): return safe_str(os.path.basename(urllib.parse.unquote(item['name'])))
+
+class ListView:
+    # items[indices[i]] without copying, so a filtered CachedList stays lazy
+    def __init__(self, items, indices): self.items, self.indices = items, indices
+
+    def __len__(self): return len(self.indices)
+
+    def __getitem__(self, i): return self.items[self.indices[i]]
+
+    def __iter__(self):
+        for i in self.indices: yield self.items[i]
+
+class ListModel:
+    # Display strings, size labels and first-letter buckets for one list.
+    # Rows are formatted the first time they are drawn and kept, so opening
+    # a long cached list decodes nothing up front; the buckets are built on
+    # the first letter jump.
+    def __init__(self, items, labels=None, sizes=None):
+        self.items = items
+        self.labels, self.sizes = labels, sizes  # None: formatted per row
+        self.formatted = {}
+        self.buckets = None
+
+    def __len__(self): return len(self.items)
+
+    def subset(self, indices):
+        if isinstance(indices, range) and len(indices) == len(self.items): return self
+        if self.labels is None and self.sizes is None: return ListModel(ListView(self.items, indices))
+        return ListModel([self.items[i] for i in indices], [self.cells(i)[0] for i in indices], [self.cells(i)[1] for i in indices])
+
+    def cells(self, i):
+        if self.labels is not None and self.sizes is not None: return self.labels[i], self.sizes[i]
+        cell = self.formatted.get(i)
+        if cell is None:
+            it = self.items[i]
+            cell = self.formatted[i] = (self.labels[i] if self.labels is not None else list_label(it),
+                                        self.sizes[i] if self.sizes is not None else format_size(it['size']))
+        return cell
+
+    def row(self, i, w):
+        label, sz_str = self.cells(i)
+        return f" {label}".ljust(w - len(sz_str) - 3) + sz_str + " "
+
+    def prebuild(self):
+        threading.Thread(target=self.letter_buckets, daemon=True).start()
+
+    def letter_buckets(self):
+        # -> (starts, bucket_of): one pass over every label, without keeping them
+        if self.buckets is None:
+            with PROFILE.span("letters"):
+                starts, bucket_of, prev = [], array('I'), None
+                for i in range(len(self.items)):
+                    label = self.labels[i] if self.labels is not None else list_label(self.items[i])
+                    letter = label[:1].upper()
+                    if letter != prev or not starts:
+                        starts.append(i)
+                        prev = letter
+                    bucket_of.append(len(starts) - 1)
+                self.buckets = starts, bucket_of
+        return self.buckets
+
+class PagedModel:
+    # ListModel for a PagedList: rows are formatted as they are drawn, since
+    # most of the list has not been fetched
+    def __init__(self, items): self.items = items
+
+    def __len__(self): return len(self.items)
+
+    @property
+    def version(self): return self.items.version
+
+    def cells(self, i):
+        item = self.items[i]
+        if item is None: return "...", self.items.state(i)
+        return safe_str(item.get('title') or item['name']), format_size(item['size'])
+
+    def row(self, i, w):
+        label, sz_str = self.cells(i)
+        return f" {label}"[:w - len(sz_str) - 4].ljust(w - len(sz_str) - 3) + sz_str + " "
+
+class SnapshotModel:
+    # The rows the last session saved around its selection, drawn on the
+    # first frame while the real list is rebuilt behind them
+    def __init__(self, window):
+        window = window or {}
+        self.count, self.start = window.get('count', 0), window.get('start', 0)
+        self.labels, self.sizes = window.get('labels', []), window.get('sizes', [])
+
+    def __len__(self): return self.count
+
+    def cells(self, i):
+        j = i - self.start
+        return (self.labels[j], self.sizes[j]) if 0 <= j < len(self.labels) else ("...", "")
+
+    def row(self, i, w):
+        label, sz_str = self.cells(i)
+        return f" {label}".ljust(w - len(sz_str) - 3) + sz_str + " "
+
+def get_letter_jump(current_idx, model, direction):
+    if not len(model): return 0
+    starts, bucket_of = model.letter_buckets()
+    b = bucket_of[current_idx]
+    if direction == 1: return starts[b + 1] if b + 1 < len(starts) else 0
+    return starts[b - 1] if b > 0 else len(model) - 1
 
 def show_popup(stdscr, title, msg, color_pair):
     h, w = stdscr.getmaxyx()
@@ -429,10 +2696,140 @@ def show_popup(stdscr, title, msg, color_pair):
     safe_addstr(stdscr, by+6, bx+2, "PRESS B TO CLOSE".center(box_w-4), color_pair)
     stdscr.refresh()
     while True:
-        if input_state['B']: 
-            time.sleep(0.3)
-            break
-        curses.napms(50)
+        ev = next_event()
+        if ev and ev[0] == 'press' and ev[1] == 'B': break
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600: return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def format_limit(kb):
+    return "OFF" if not kb else format_size(kb * 1024) + "/s"
+
+def queue_status(job):
+    if job.status == "ACTIVE":
+        if job.total > 0:
+            eta = f" {format_eta((job.total - job.done) / job.speed)}" if job.speed > 0 else ""
+            return f"{int(min(1.0, job.done / job.total)*100)}% {format_size(job.speed)}/s{eta}"
+        return f"{format_size(job.done)} {format_size(job.speed)}/s"
+    return job.status
+
+def draw_screen(stdscr, header_txt, footer_txt, row_text, start, end, idx, overlay=None):
+    h, w = stdscr.getmaxyx()
+    stdscr.erase()
+    stdscr.bkgd(' ', curses.color_pair(1))
+    safe_addstr(stdscr, 0, 0, header_txt, 3)
+    safe_addstr(stdscr, 1, 0, "-"*w, 3)
+    for i in range(start, end): safe_addstr(stdscr, 2 + (i - start), 1, row_text(i, w), 2 if i == idx else 1)
+    safe_addstr(stdscr, h-1, 0, footer_txt.center(w), 2)
+    if overlay: overlay(stdscr)
+    stdscr.refresh()
+
+STATS_SPANS = [("render", "FRAME"), ("render.rows", "ROWS"), ("search", "SEARCH"), ("fetch.api", "FETCH API"), ("fetch.html", "FETCH HTML"),
+               ("parse.api", "PARSE API"), ("parse.html", "PARSE HTML"), ("cache.load", "CACHE LOAD"), ("cache.save", "CACHE SAVE")]
+
+def draw_stats(stdscr):
+    spans, counters = PROFILE.snapshot()
+    lines = [f"{'STATS':<10}{'N':>4}{'AVG MS':>8}{'MAX MS':>9}"]
+    for name, label in STATS_SPANS:
+        st = spans.get(name)
+        if st: lines.append(f"{label[:10]:<10}{st[0]:>4}{1000*st[1]/st[0]:>8.1f}{1000*st[2]:>9.1f}")
+    nbytes = counters.get("dl.bytes", 0)
+    if nbytes:
+        net, disk = spans.get("dl.read", [0, 0.0])[1], spans.get("dl.card", spans.get("dl.write", [0, 0.0]))[1]
+        lines.append(f"DL {format_size(nbytes)} NET {format_size(nbytes / max(0.001, net))}/s")
+        lines.append(f"   DISK {format_size(nbytes / max(0.001, disk))}/s")
+        # time the socket waited because every write buffer was still queued
+        if "dl.stall" in spans: lines.append(f"   STALL {spans['dl.stall'][1]:.1f}s")
+    with HTTP.lock: st = dict(HTTP.stats)
+    lines.append(f"HTTP {st['requests']} REQ {st['reused']} REUSED {st['retries']} RETRY")
+    lines.append(f"LOG {len(LOGGER.pending)} PENDING")
+    h, w = stdscr.getmaxyx()
+    box_w = min(w - 2, max(len(line) for line in lines) + 2)
+    x = max(0, w - box_w - 1)
+    for i, line in enumerate(lines[:h - 4]): safe_addstr(stdscr, 2 + i, x, f" {line}".ljust(box_w), 3 if i == 0 else 2)
+
+GLOBAL_ROW = "[ SEARCH ALL COLLECTIONS ]"
+
+def run_global_search(stdscr, term):
+    # -> (term, [(sys_data, item)]) or None when cancelled with an empty term
+    GLOBAL_SEARCH.start(COLLECTIONS)
+    def live_count(t):
+        if GLOBAL_SEARCH.busy(): return "INDEXING %d/%d" % GLOBAL_SEARCH.progress
+        return f"{GLOBAL_SEARCH.count(t)} MATCHES"
+    term = run_keyboard(stdscr, "SEARCH ALL COLLECTIONS", live_count, term)
+    if not term: return None
+    h, w = stdscr.getmaxyx()
+    safe_addstr(stdscr, h//2, w//2 - 8, " SEARCHING... ", 3)
+    stdscr.refresh()
+    GLOBAL_SEARCH.wait()
+    return term.lower(), GLOBAL_SEARCH.results(term)
+
+def results_model(results):
+    return ListModel([item for _, item in results],
+                     sizes=[f"{safe_str(sys_data[0])[:14]} {format_size(item['size'])}" for sys_data, item in results])
+
+# --- SESSION ---
+# session.json remembers the last view, collection, filter and selection,
+# plus the rows around the selection, so a launch can draw that screen at
+# once and reopen the real list on a thread.
+SESSION_WINDOW = 40  # rows saved either side of the selection
+
+def load_session():
+    try:
+        with open(SESSION_FILE, "r") as f: return json.load(f)
+    except: return {}
+
+def save_session(state):
+    try:
+        tmp = SESSION_FILE + ".tmp"
+        with open(tmp, "w") as f: json.dump(state, f)
+        os.replace(tmp, SESSION_FILE)
+    except Exception as e: log(f"Session save failed: {e}")
+
+def session_window(model, idx):
+    a, b = max(0, idx - SESSION_WINDOW), min(len(model), idx + SESSION_WINDOW + 1)
+    cells = [model.cells(i) for i in range(a, b)]
+    return {'start': a, 'count': len(model), 'labels': [c[0] for c in cells], 'sizes': [c[1] for c in cells]}
+
+class SessionRestore:
+    # Reopens the saved list in the background. `result` is a dict with
+    # 'items' (a COLLECTION's PagedList) and/or the file list and its models;
+    # whatever failed to load is missing.
+    def __init__(self, session, sys_data):
+        self.session, self.sys_data = session, sys_data
+        self.result = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        out = {}
+        try: self._open(out)
+        except Exception as e: log(f"Session restore failed: {e}")
+        self.result = out
+
+    def _open(self, out):
+        ses, sys_data = self.session, self.sys_data
+        with PROFILE.span("session.restore"):
+            if sys_data[1] == "COLLECTION":
+                items, _ = fetch_paged(sys_data, False, ses.get('item_term', ""), UI_RETRIES)
+                if not items: return
+                out['items'] = items
+                if ses.get('view') != "FILES" or not ses.get('item'): return
+                sys_data = item_collection(sys_data, ses['item'])
+            files, _ = fetch_collection(sys_data, False, retries=UI_RETRIES)
+            if not files: return
+            full, index = ListModel(files), SearchIndex(files)
+            term = ses.get('filter', "")
+            shown = full.subset(index.search(term)) if term else full
+            full.prebuild()
+            index.prebuild()
+            out.update(sys=sys_data, files=files, full=full, index=index, shown=shown)
+
+    def wait(self):
+        self.thread.join()
+        return self.result
 
 def main(stdscr):
     curses.start_color()
@@ -443,143 +2840,472 @@ def main(stdscr):
     curses.curs_set(0)
     stdscr.nodelay(True)
     
-    with open(LOG_FILE, "w") as f: f.write("Session Start\n")
+    LOGGER.reset("Session Start")
     
     if not load_collections(stdscr): return
 
     calibrate(stdscr)
     threading.Thread(target=input_worker, daemon=True).start()
+    load_settings()
+    DOWNLOADS.load()
+    DOWNLOADS.start()
+    refresher = CollectionRefresher(max(1, int(SETTINGS['refresh_concurrency'])))
+    if SETTINGS['prefetch_on_start']: refresher.refresh(COLLECTIONS, False)
     
     view = "COLLECTIONS"
+    prev_view = "COLLECTIONS"
     sel_sys = 0
     sel_game = 0
+    sel_job = 0
     full_game_list = []
     game_list = []
-    last_input = 0
+    full_model = game_model = None
+    sys_model, sys_model_key = None, None
+    search_index = None
+    filter_term = ""
+    notice, notice_until = "", 0
+    last_frame, last_idx = None, -1
+    stats_on, start_armed = False, False
+    syncer = None
+    global_term, result_sys = "", []
+    cur_sys, files_parent = None, "COLLECTIONS"
+    item_model, item_term, sel_item = None, "", 0
+    
+    # warm start: show the last session's screen from its saved rows now,
+    # swap in the real list when SessionRestore has rebuilt it
+    session, restore, held = load_session(), None, None
+    names = [x[0] for x in COLLECTIONS]
+    if session.get('collection') in names:
+        sel_sys = names.index(session['collection'])
+        sys_data = COLLECTIONS[sel_sys]
+        want = session.get('view')
+        if want == "FILES" or (want == "ITEMS" and sys_data[1] == "COLLECTION"):
+            restore = SessionRestore(session, sys_data)
+            window = session.get('window')
+            if want == "ITEMS":
+                item_model = SnapshotModel(window)
+                item_term, sel_item = session.get('item_term', ""), session.get('sel', 0)
+            else:
+                cur_sys = item_collection(sys_data, session['item']) if session.get('item') else sys_data
+                files_parent = "ITEMS" if session.get('item') else "COLLECTIONS"
+                if session.get('stamp') != list(cache_stamp(cur_sys[0]) or ()): window = None  # the list changed since
+                game_model = game_list = SnapshotModel(window)
+                filter_term, sel_game = session.get('filter', ""), session.get('sel', 0)
+                item_term = session.get('item_term', "")
+            view = want
+    
+    def open_files(sys_data, files, parent):
+        # a freshly loaded list in the FILES view; parent is the view B returns to
+        nonlocal cur_sys, files_parent, full_game_list, game_list, full_model, game_model, search_index, filter_term, view, sel_game
+        cur_sys, files_parent = sys_data, parent
+        full_game_list = game_list = files
+        full_model = game_model = ListModel(files)
+        full_model.prebuild()
+        search_index = SearchIndex(files)
+        search_index.prebuild()
+        filter_term = ""
+        view = "FILES"
+        sel_game = 0
+    
+    def session_state():
+        v = prev_view if view == "QUEUE" else view
+        state = {'view': v, 'collection': COLLECTIONS[sel_sys][0] if sel_sys < len(COLLECTIONS) else None, 'item_term': item_term}
+        if v == "ITEMS": state.update(sel=sel_item, window=session_window(item_model, sel_item))
+        elif v == "FILES":
+            state.update(sel=sel_game, filter=filter_term, item=cur_sys[2] if files_parent == "ITEMS" else None,
+                         stamp=list(cache_stamp(cur_sys[0]) or ()), window=session_window(game_model, sel_game))
+        else: state['view'] = "COLLECTIONS"
+        return state
+    saved_state = None
     
     while True:
-        stdscr.erase()
+        if restore is not None and restore.result is not None:
+            res, restore = restore.result, None
+            if 'items' in res: item_model = PagedModel(res['items'])
+            if 'files' in res:
+                cur_sys, full_game_list = res['sys'], res['files']
+                full_model, search_index, game_model = res['full'], res['index'], res['shown']
+                game_list = game_model.items
+                sel_game = min(sel_game, max(0, len(game_model) - 1))
+            elif view == "FILES": view = "ITEMS" if 'items' in res else "COLLECTIONS"
+            elif 'items' not in res: view = "COLLECTIONS"
+            if 'items' not in res: files_parent = "COLLECTIONS"
+            if view == "ITEMS": sel_item = min(sel_item, max(0, len(item_model) - 1))
+            last_frame = None
         h, w = stdscr.getmaxyx()
-        stdscr.bkgd(' ', curses.color_pair(1))
         
         # HEADER
-        title = "COLLECTIONS" if view == "COLLECTIONS" else COLLECTIONS[sel_sys][0]
-        hint = f"[{len(game_list)}] X:Search B:Back" if view == "FILES" else "A:Select Y:Refresh"
+        if view == "COLLECTIONS": title, hint = "COLLECTIONS", "A:Select Y:Refresh"
+        elif view == "QUEUE": title, hint = "QUEUE", f"LIMIT:{format_limit(SETTINGS['download_limit'])}"
+        elif view == "RESULTS": title, hint = f"SEARCH {global_term}", f"[{len(game_list)}] X:Search B:Back"
+        elif view == "ITEMS": title, hint = f"{COLLECTIONS[sel_sys][0]} {item_term}".strip(), f"[{len(item_model)}] X:Search B:Back"
+        else: title, hint = cur_sys[0], f"[{len(game_list)}] X:Search B:Back"
         header_txt = f" ARCHIVE BROWSER | {safe_str(title)} | {hint} ".ljust(w)
         
-        safe_addstr(stdscr, 0, 0, header_txt, 3)
-        safe_addstr(stdscr, 1, 0, "-"*w, 3)
-        
-        items = [{'name': x[0], 'size': None} for x in COLLECTIONS] if view == "COLLECTIONS" else game_list
-        idx = sel_sys if view == "COLLECTIONS" else sel_game
-        if idx >= len(items) and items: idx = len(items) - 1
+        jobs = list(DOWNLOADS.jobs)
+        def queue_row(i, w):
+            sz_str = queue_status(jobs[i])
+            return f" {jobs[i].label()}".ljust(w - len(sz_str) - 3) + sz_str + " "
+        if view == "COLLECTIONS" and sys_model_key != (refresher.version, int(time.time() // 60)):
+            sys_model_key = (refresher.version, int(time.time() // 60))
+            sys_model = ListModel([{'name': x[0], 'size': None} for x in COLLECTIONS] + [{'name': GLOBAL_ROW, 'size': None}],
+                                  sizes=[collection_status(x, refresher) for x in COLLECTIONS] + [""])
+        if view == "COLLECTIONS": model, idx = sys_model, sel_sys
+        elif view == "QUEUE": model, idx = jobs, sel_job
+        elif view == "ITEMS": model, idx = item_model, sel_item
+        else: model, idx = game_model, sel_game
+        if idx >= len(model) and len(model): idx = len(model) - 1
         
         max_rows = h - 4
         start = max(0, idx - (max_rows // 2))
-        end = min(len(items), start + max_rows)
+        end = min(len(model), start + max_rows)
         
-        for i in range(start, end):
-            y = 2 + (i - start)
-            raw_name = os.path.basename(urllib.parse.unquote(items[i]['name']))
-            display_name = safe_str(raw_name)
-            sz_str = format_size(items[i]['size'])
-            row_content = f" {display_name}".ljust(w - len(sz_str) - 3) + sz_str + " "
-            color = 2 if i == idx else 1
-            safe_addstr(stdscr, y, 1, row_content, color)
+        active, queued = DOWNLOADS.counts()
+        dl_txt = f"  DL:{active}/{active+queued}" if active or queued else ""
+        if view == "COLLECTIONS": footer_txt = f" A:SELECT  X:REFRESH ALL  Y:REFRESH  START:QUEUE  B:EXIT{dl_txt} "
+        elif view == "QUEUE": footer_txt = " A:RETRY  X:CANCEL  Y:CLEAR DONE  L/R:LIMIT  B:BACK "
+        elif view == "ITEMS": footer_txt = f" A:OPEN  X:SEARCH  Y:REFRESH  L/R:PAGE  START:QUEUE  B:BACK{dl_txt} "
+        elif view == "RESULTS": footer_txt = f" [{len(game_list)}] A:QUEUE  X:SEARCH  START:QUEUE  B:BACK{dl_txt} "
+        else: footer_txt = f" [{len(game_list)}] A:QUEUE  X:SEARCH  Y:SYNC  L/R:JUMP  START:QUEUE  B:BACK{dl_txt} "
+        if syncer is not None:
+            notice, notice_until = syncer.status, time.time() + 3
+            if syncer.done: syncer = None
+        if time.time() < notice_until: footer_txt = f" {notice} "
         
-        if view == "COLLECTIONS": footer_txt = " A:SELECT  Y:FORCE REFRESH  START:EXIT "
-        else: footer_txt = f" [{len(game_list)}] A:DL  X:SEARCH  L/R:JUMP  B:BACK "
-        safe_addstr(stdscr, h-1, 0, footer_txt.center(w), 2)
-        
-        stdscr.refresh()
+        # only repaint what changed: nothing, the two selection rows, or the whole screen
+        frame = (view, id(model), len(model), start, h, w, header_txt, footer_txt, DOWNLOADS.version, getattr(model, 'version', 0))
+        # progress is redrawn at PROGRESS_FPS, however often the download threads update it
+        if view == "QUEUE": frame += (idx, int(time.time() * PROGRESS_FPS) if active else 0)
+        if stats_on: frame += (idx, int(time.time()))
+        if frame != last_frame:
+            with PROFILE.span("render"):
+                draw_screen(stdscr, header_txt, footer_txt, queue_row if view == "QUEUE" else model.row, start, end, idx, draw_stats if stats_on else None)
+        elif idx != last_idx:
+            with PROFILE.span("render.rows"):
+                for i, color in ((last_idx, 1), (idx, 2)):
+                    if start <= i < end: safe_addstr(stdscr, 2 + (i - start), 1, model.row(i, w), color)
+                stdscr.refresh()
+        last_frame, last_idx = frame, idx
         
+        # block until input arrives; wake up periodically for download progress and notices
+        loading = restore is not None or (view == "ITEMS" and item_model.items.busy())
+        if held is not None: ev, held = held, None
+        else: ev = next_event(1.0 / PROGRESS_FPS if active or time.time() < notice_until or refresher.busy() or loading else 1.0)
+        if ev is None:
+            # idle: remember where we are for the next launch
+            if restore is None:
+                state = session_state()
+                if state != saved_state: save_session(state)
+                saved_state = state
+            continue
+        key = ev[1]
+        if restore is not None and key not in ('UP', 'DOWN'):
+            # anything but scrolling needs the real list
+            restore.wait()
+            held = ev
+            continue
+        if ev[0] == 'release':
+            # START opens the queue on release, unless it was part of the START+Y stats combo
+            if key == 'START' and start_armed and view != "QUEUE":
+                prev_view = view
+                view = "QUEUE"
+                sel_job = 0
+            if key == 'START': start_armed = False
+            continue
         now = time.time()
-        if now - last_input > 0.1:
-            if input_state['UP']:
-                if view == "COLLECTIONS": sel_sys = max(0, sel_sys - 1)
-                else: sel_game = max(0, sel_game - 1)
-                last_input = now
-            elif input_state['DOWN']:
-                if view == "COLLECTIONS": sel_sys = min(len(items)-1, sel_sys + 1)
-                else: sel_game = min(len(items)-1, sel_game + 1)
-                last_input = now
-            elif input_state['RIGHT']:
-                if view == "FILES": sel_game = get_letter_jump(sel_game, game_list, 1)
-                last_input = now + 0.2
-            elif input_state['LEFT']:
-                if view == "FILES": sel_game = get_letter_jump(sel_game, game_list, -1)
-                last_input = now + 0.2
-            elif input_state['X']:
-                if view == "FILES":
-                    term = run_keyboard(stdscr, "SEARCH")
-                    if term is not None:
-                        term = term.lower()
-                        if term == "": game_list = full_game_list
-                        else: game_list = [g for g in full_game_list if term in urllib.parse.unquote(g['name']).lower()]
-                        sel_game = 0
-                    last_input = now + 0.3
-            elif input_state['B']:
-                if view == "FILES": 
-                    view = "COLLECTIONS"
-                    game_list = []
-                    full_game_list = []
-                else: break
-                last_input = now + 0.3
-                
-            elif input_state['A']:
-                if view == "COLLECTIONS":
+        if key == 'Y' and input_state['START']:
+            stats_on, start_armed = not stats_on, False
+            last_frame = None
+            continue
+        if key == 'UP':
+            if view == "COLLECTIONS": sel_sys = max(0, sel_sys - 1)
+            elif view == "QUEUE": sel_job = max(0, sel_job - 1)
+            elif view == "ITEMS": sel_item = max(0, sel_item - 1)
+            else: sel_game = max(0, sel_game - 1)
+        elif key == 'DOWN':
+            if view == "COLLECTIONS": sel_sys = min(len(model)-1, sel_sys + 1)
+            elif view == "QUEUE": sel_job = max(0, min(len(model)-1, sel_job + 1))
+            elif view == "ITEMS": sel_item = max(0, min(len(model)-1, sel_item + 1))
+            else: sel_game = min(len(model)-1, sel_game + 1)
+        elif key in ('LEFT', 'RIGHT'):
+            step = 1 if key == 'RIGHT' else -1
+            if view == "FILES": sel_game = get_letter_jump(sel_game, game_model, step)
+            elif view == "ITEMS": sel_item = max(0, min(len(model)-1, sel_item + step * PAGE_ROWS))
+            elif view == "QUEUE":
+                # bandwidth cap for this session; settings.json sets the one used at start
+                cur = SETTINGS['download_limit']
+                pos = RATE_STEPS.index(cur) if cur in RATE_STEPS else 0
+                SETTINGS['download_limit'] = RATE_STEPS[max(0, min(len(RATE_STEPS) - 1, pos + step))]
+                LIMITER.set_rate(SETTINGS['download_limit'] * 1024)
+        elif key == 'START':
+            if ev[0] == 'press': start_armed = True
+        elif key == 'X':
+            if view == "FILES":
+                live = {}
+                def live_count(t):
+                    live['hits'] = search_index.search(t)
+                    return f"{len(live['hits'])} MATCHES"
+                def live_list(box):
+                    # the matches so far, drawn straight from the full model: no subset per keystroke
+                    hits, (h, w) = live['hits'], stdscr.getmaxyx()
+                    header = f" ARCHIVE BROWSER | {safe_str(cur_sys[0])} | [{len(hits)}] ".ljust(w)
+                    draw_screen(stdscr, header, "", lambda i, w: full_model.row(hits[i], w), 0, min(len(hits), h - 4), -1, box)
+                term = run_keyboard(stdscr, "SEARCH", live_count, filter_term, live_list)
+                last_frame = None
+                if term is not None:
+                    filter_term = term.lower()
+                    game_model = full_model.subset(search_index.search(filter_term))
+                    game_list = game_model.items
+                    sel_game = 0
+            elif view == "RESULTS":
+                found = run_global_search(stdscr, global_term)
+                last_frame = None
+                if found:
+                    global_term, results = found
+                    result_sys = [sys_data for sys_data, _ in results]
+                    game_model = results_model(results)
+                    game_list = game_model.items
+                    sel_game = 0
+            elif view == "ITEMS":
+                term = run_keyboard(stdscr, "SEARCH COLLECTION", None, item_term)
+                last_frame = None
+                if term is not None:
                     h, w = stdscr.getmaxyx()
-                    safe_addstr(stdscr, h//2, w//2 - 8, " LOADING... ", 3)
+                    safe_addstr(stdscr, h//2, w//2 - 8, " SEARCHING... ", 3)
                     stdscr.refresh()
-                    
-                    sys_data = COLLECTIONS[sel_sys]
-                    mode = sys_data[1]
-                    if mode == "API":
-                        files, err = fetch_api_list(sys_data[0], sys_data[2], sys_data[3], sys_data[5], False)
-                    else:
-                        files, err = fetch_html_list(sys_data[0], sys_data[2], sys_data[5], False)
-                    
-                    if files:
-                        full_game_list = files
-                        game_list = files
-                        view = "FILES"
+                    items, err = fetch_paged(COLLECTIONS[sel_sys], False, term.strip(), UI_RETRIES)
+                    if items:
+                        item_model, item_term, sel_item = PagedModel(items), term.strip(), 0
+                    else: show_popup(stdscr, "SEARCH", err, 2)
+            elif view == "COLLECTIONS":
+                refresher.refresh(COLLECTIONS, True)
+            elif view == "QUEUE":
+                if jobs: DOWNLOADS.cancel(jobs[idx])
+        elif key == 'B':
+            if view == "ITEMS":
+                view = "COLLECTIONS"
+                item_model, item_term = None, ""
+            elif view in ("FILES", "RESULTS"):
+                view = files_parent if view == "FILES" else "COLLECTIONS"
+                result_sys = []
+                sys_model_key = None
+                game_list = []
+                full_game_list = []
+                full_model = game_model = None
+                search_index = None
+                filter_term = ""
+            elif view == "QUEUE": view = prev_view
+            else: break
+            
+        elif key == 'A':
+            if view == "COLLECTIONS" and sel_sys == len(COLLECTIONS):
+                found = run_global_search(stdscr, global_term)
+                last_frame = None
+                if found:
+                    global_term, results = found
+                    if results:
+                        result_sys = [sys_data for sys_data, _ in results]
+                        game_model = results_model(results)
+                        game_list = game_model.items
+                        view = "RESULTS"
                         sel_game = 0
-                    else: show_popup(stdscr, "ERROR", err, 2)
-                    last_input = now + 0.3
+                    else: show_popup(stdscr, "SEARCH", "NO MATCHES IN CACHED COLLECTIONS", 2)
+            elif view == "COLLECTIONS":
+                h, w = stdscr.getmaxyx()
+                safe_addstr(stdscr, h//2, w//2 - 8, " LOADING... ", 3)
+                stdscr.refresh()
                 
-                elif view == "FILES":
-                    sys_data = COLLECTIONS[sel_sys]
-                    mode = sys_data[1]
-                    if mode == "API":
-                        success, msg = download_file(stdscr, sys_data[2], game_list[sel_game]['name'], sys_data[4], game_list[sel_game]['size'])
-                    else:
-                        success, msg = download_file(stdscr, None, game_list[sel_game]['name'], sys_data[4], None)
-                    
-                    if success: show_popup(stdscr, "SUCCESS", msg, 2)
-                    else: show_popup(stdscr, "ERROR", msg, 2)
-                    last_input = now + 0.5
+                sys_data = COLLECTIONS[sel_sys]
+                files, err = fetch_collection(sys_data, False, retries=UI_RETRIES)
+                
+                if files and sys_data[1] == "COLLECTION":
+                    item_model, item_term = PagedModel(files), ""
+                    view = "ITEMS"
+                    sel_item = 0
+                elif files:
+                    open_files(sys_data, files, "COLLECTIONS")
+                else: show_popup(stdscr, "ERROR", err, 2)
+                last_frame = None
             
-            elif input_state['Y']:
-                if view == "COLLECTIONS":
-                    h, w = stdscr.getmaxyx()
-                    safe_addstr(stdscr, h//2, w//2 - 8, " REFRESHING... ", 3)
-                    stdscr.refresh()
-                    sys_data = COLLECTIONS[sel_sys]
-                    mode = sys_data[1]
-                    if mode == "API":
-                        files, err = fetch_api_list(sys_data[0], sys_data[2], sys_data[3], sys_data[5], True)
-                    else:
-                        files, err = fetch_html_list(sys_data[0], sys_data[2], sys_data[5], True)
-                    if files:
-                        full_game_list = files
-                        game_list = files
-                        view = "FILES"
-                        sel_game = 0
-                    else: show_popup(stdscr, "ERROR", err, 2)
-                    last_input = now + 0.3
-        curses.napms(30)
+            elif view == "ITEMS":
+                item = item_model.items[sel_item] if len(item_model) else None
+                if item is None:
+                    notice, notice_until = "STILL LOADING", now + 2
+                    continue
+                h, w = stdscr.getmaxyx()
+                safe_addstr(stdscr, h//2, w//2 - 8, " LOADING... ", 3)
+                stdscr.refresh()
+                sys_data = item_collection(COLLECTIONS[sel_sys], item['name'])
+                files, err = fetch_collection(sys_data, False, retries=UI_RETRIES)
+                if files:
+                    open_files(sys_data, files, "ITEMS")
+                else: show_popup(stdscr, "ERROR", err, 2)
+                last_frame = None
+
+            elif view in ("FILES", "RESULTS"):
+                if game_list:
+                    sys_data = result_sys[sel_game] if view == "RESULTS" else cur_sys
+                    item = game_list[sel_game]
+                    added = enqueue_item(DOWNLOADS, sys_data, item)
+                    label = safe_str(os.path.basename(urllib.parse.unquote(item['name'])))
+                    notice = f"QUEUED: {label}" if added else f"ALREADY QUEUED: {label}"
+                    notice_until = now + 2
+
+            elif view == "QUEUE":
+                if jobs: DOWNLOADS.retry(jobs[idx])
+        
+        elif key == 'Y':
+            if view == "COLLECTIONS" and sel_sys < len(COLLECTIONS):
+                h, w = stdscr.getmaxyx()
+                safe_addstr(stdscr, h//2, w//2 - 8, " REFRESHING... ", 3)
+                stdscr.refresh()
+                sys_data = COLLECTIONS[sel_sys]
+                files, err = fetch_collection(sys_data, True, retries=UI_RETRIES)
+                if files and sys_data[1] == "COLLECTION":
+                    item_model, item_term = PagedModel(files), ""
+                    view = "ITEMS"
+                    sel_item = 0
+                elif files:
+                    open_files(sys_data, files, "COLLECTIONS")
+                else: show_popup(stdscr, "ERROR", err, 2)
+                last_frame = None
+            elif view == "FILES":
+                if syncer is None: syncer = SyncRun(cur_sys, DOWNLOADS)
+            elif view == "ITEMS":
+                h, w = stdscr.getmaxyx()
+                safe_addstr(stdscr, h//2, w//2 - 8, " REFRESHING... ", 3)
+                stdscr.refresh()
+                items, err = fetch_paged(COLLECTIONS[sel_sys], True, item_term, UI_RETRIES)
+                if items: item_model, sel_item = PagedModel(items), 0
+                else: show_popup(stdscr, "ERROR", err, 2)
+                last_frame = None
+            elif view == "QUEUE":
+                DOWNLOADS.clear_finished()
+                sel_job = 0
+    if restore is None: save_session(session_state())
+    log(f"HTTP: {HTTP.summary()}")
+    log(f"PROFILE: {PROFILE.summary()}")
+
+# --- BATCH MODE ---
+# Exit codes for scripted use (argparse itself exits with 2 on bad usage)
+EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_LIST, EXIT_INTERRUPTED = 0, 1, 2, 3, 130
+
+def emit(event, **fields):
+    record = {'event': event, 'time': round(time.time(), 3)}
+    record.update(fields)
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+def item_dest(sys_data, item):
+    return os.path.join(STORAGE_ROOT, sys_data[4], os.path.basename(urllib.parse.unquote(item['name'])))
+
+def select_items(files, pattern, wanted):
+    out = []
+    for item in files:
+        base = os.path.basename(urllib.parse.unquote(item['name']))
+        if wanted is not None:
+            if base in wanted or item['name'] in wanted: out.append(item)
+        elif pattern:
+            if any(c in pattern for c in "*?["):
+                if fnmatch.fnmatch(base.lower(), pattern.lower()): out.append(item)
+            elif pattern.lower() in base.lower(): out.append(item)
+        else: out.append(item)
+    return out
+
+def run_batch(argv):
+    import argparse
+    ap = argparse.ArgumentParser(prog="ArchiveDownloader.py", description="Download files from a collection in collections.json without the UI. Progress is printed as JSON lines.")
+    ap.add_argument("--collection", help="collection name as written in collections.json")
+    ap.add_argument("--item", help="item identifier, for COLLECTION entries")
+    ap.add_argument("--match", help="substring or glob (*, ?) matched against file names")
+    ap.add_argument("--list", dest="list_file", help="text file with one file name per line")
+    ap.add_argument("--jobs", type=int, default=DOWNLOAD_WORKERS, help="parallel downloads (default %(default)s)")
+    ap.add_argument("--dry-run", action="store_true", help="print what would be downloaded and exit")
+    ap.add_argument("--skip-existing", action="store_true", help="skip files already on disk with the expected size")
+    ap.add_argument("--refresh", action="store_true", help="re-fetch the file list instead of using the cache")
+    ap.add_argument("--sync", action="store_true", help="only download files missing on disk or not matching the metadata size/md5")
+    ap.add_argument("--collections", action="store_true", help="print the configured collections and exit")
+    args = ap.parse_args(argv)
+
+    if not read_collections():
+        emit("error", msg="collections.json missing or empty")
+        return EXIT_USAGE
+    load_settings()
+    if args.collections:
+        for sys_data in COLLECTIONS: emit("collection", name=sys_data[0], method=sys_data[1], folder=sys_data[4])
+        return EXIT_OK
+    sys_data = next((c for c in COLLECTIONS if c[0] == args.collection), None)
+    if sys_data is None:
+        emit("error", msg=f"unknown collection: {args.collection}")
+        return EXIT_USAGE
+    if sys_data[1] == "COLLECTION":
+        if not args.item:
+            emit("error", msg="COLLECTION entries need --item IDENTIFIER")
+            return EXIT_USAGE
+        sys_data = item_collection(sys_data, args.item)
+
+    wanted = None
+    if args.list_file:
+        try:
+            with open(args.list_file, "r") as f: wanted = {line.strip() for line in f if line.strip()}
+        except OSError as e:
+            emit("error", msg=f"cannot read list: {e}")
+            return EXIT_USAGE
+
+    files, err = fetch_for_sync(sys_data) if args.sync else fetch_collection(sys_data, args.refresh)
+    if not files:
+        emit("error", msg=err or "empty list")
+        return EXIT_LIST
+    items = select_items(files, args.match, wanted)
+    emit("list", collection=sys_data[0], total=len(files), selected=len(items))
+
+    dl_queue = DownloadQueue(path=None, workers=max(1, args.jobs))
+    skipped = 0
+    if args.sync:
+        items, skipped = sync_plan(sys_data, items)
+        emit("sync", in_sync=skipped, to_download=len(items))
+    for item in items:
+        dest = item_dest(sys_data, item)
+        if args.skip_existing and os.path.exists(dest):
+            size = item['size'] if sys_data[1] == "API" else None
+            if not size or os.path.getsize(dest) == int(float(size)):
+                emit("skip", name=item['name'], dest=dest)
+                skipped += 1
+                continue
+        if args.dry_run: emit("plan", name=item['name'], dest=dest, size=item['size'])
+        else: enqueue_item(dl_queue, sys_data, item)
+    if args.dry_run or not dl_queue.jobs:
+        emit("summary", ok=0, failed=0, skipped=skipped, bytes=0, seconds=0)
+        return EXIT_OK
+
+    start = time.time()
+    dl_queue.start()
+    reported = set()
+    try:
+        while True:
+            time.sleep(1)
+            for job in list(dl_queue.jobs):
+                if job.status == "ACTIVE":
+                    emit("progress", name=job.name, done=job.done, total=int(job.total), speed=int(job.speed))
+                elif job.status in ("DONE", "FAILED", "CANCELLED") and id(job) not in reported:
+                    reported.add(id(job))
+                    emit("done", name=job.name, ok=job.status == "DONE", msg=job.msg, bytes=job.done)
+            if len(reported) == len(dl_queue.jobs): break
+    except KeyboardInterrupt:
+        for job in list(dl_queue.jobs): dl_queue.cancel(job)
+        emit("interrupted")
+        return EXIT_INTERRUPTED
+    ok = sum(1 for j in dl_queue.jobs if j.status == "DONE")
+    failed = len(dl_queue.jobs) - ok
+    total_bytes = sum(j.done for j in dl_queue.jobs if j.status == "DONE")
+    elapsed = time.time() - start
+    emit("summary", ok=ok, failed=failed, skipped=skipped, bytes=total_bytes, seconds=round(elapsed, 1), speed=int(total_bytes / max(0.001, elapsed)))
+    log(f"HTTP: {HTTP.summary()}")
+    log(f"PROFILE: {PROFILE.summary()}")
+    return EXIT_FAILED if failed else EXIT_OK
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1: sys.exit(run_batch(sys.argv[1:]))
     try: curses.wrapper(main)
     except Exception as e:
         with open("crash.log", "w") as f: f.write(str(e))
\ No newline at end of file
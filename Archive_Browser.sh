@@ -17,8 +17,8 @@ if [ -d "ArchiveApp" ]; then
     cd ArchiveApp
 fi
 
-# 5. Run the Python Tool
-python3 ArchiveDownloader.py 2> launch_error.txt
+# 5. Run the Python Tool (-m keeps the compiled bytecode in __pycache__ between launches)
+python3 -m ArchiveDownloader 2> launch_error.txt
 
 # 6. Clean exit
 printf "\033c"
\ No newline at end of file
@@ -0,0 +1,379 @@
+# ArchiveBrowser benchmark suite
+#
+# Starts a local stand-in for archive.org (synthetic /metadata/{ident} JSON,
+# /download/ directory listings and files of any size) and measures list
+# fetch+parse, cache load, search keystrokes, frame rendering and download
+# throughput. Every measurement runs in its own child process so peak RSS
+# belongs to that scenario alone.
+#
+#   python3 benchmark.py                          quick profile -> bench_results.json
+#   python3 benchmark.py --full                   adds 200k-entry lists and 1-2 GB files
+#   python3 benchmark.py --only search,render     run a subset of scenarios
+#   python3 benchmark.py --compare baseline.json  run, then compare with an earlier result
+#
+# Not needed on the device; copy only ArchiveDownloader.py there.
+
+import argparse
+import fcntl
+import http.server
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import termios
+import threading
+import time
+import urllib.parse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+QUICK = {
+    'lists': [100, 1000, 10000, 50000],
+    'downloads': [1 << 20, 16 << 20, 128 << 20]
+}
+FULL = {
+    'lists': [100, 1000, 10000, 50000, 200000],
+    'downloads': [1 << 20, 16 << 20, 128 << 20, 1 << 30, 2 << 30]
+}
+SEARCH_TERM = "super mario"
+RENDER_FRAMES = 300
+
+WORDS = ["Super", "Mario", "Zelda", "Sonic", "Final", "Fantasy", "Street", "Fighter", "World",
+         "Castle", "Racing", "Tetris", "Kart", "Metal", "Gear", "Solid", "Crash", "Spyro", "Tekken", "Ridge"]
+REGIONS = ["(USA)", "(Europe)", "(Japan)", "(USA, Europe)", "(World)"]
+EXTS = [".zip", ".zip", ".zip", ".7z", ".txt", ".xml"]
+
+def entry_name(i):
+    words = " ".join(WORDS[(i * p) % len(WORDS)] for p in (1, 7, 13))
+    return f"roms/{words} {i} {REGIONS[i % len(REGIONS)]}{EXTS[i % len(EXTS)]}"
+
+def entry_size(i):
+    return (i * 7919) % (64 << 20) + 1024
+
+def human_size(n):
+    for unit in ("", "K", "M", "G"):
+        if n < 1024: return f"{n:.1f}{unit}" if unit else str(n)
+        n /= 1024
+    return f"{n:.1f}T"
+
+# --- STAND-IN SERVER ---
+class StandIn(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    bodies = {}
+    lock = threading.Lock()
+    pattern = bytes((i * 131 + (i >> 8)) & 0xFF for i in range(1 << 20))
+
+    def log_message(self, *args): pass
+
+    def body(self, key, build):
+        with self.lock:
+            if key not in self.bodies: self.bodies[key] = build()
+            return self.bodies[key]
+
+    def send_body(self, data, ctype):
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", f'"{len(data)}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urllib.parse.unquote(self.path.split("?")[0])
+        m = re.match(r"/metadata/bench-(\d+)$", path)
+        if m: return self.send_body(self.body(("meta", m.group(1)), lambda: build_metadata(int(m.group(1)))), "application/json")
+        m = re.match(r"/download/bench-(\d+)/$", path)
+        if m: return self.send_body(self.body(("html", m.group(1)), lambda: build_listing(int(m.group(1)))), "text/html")
+        m = re.match(r"/download/bench-\d+/blob-(\d+)\.bin$", path)
+        if m: return self.send_blob(int(m.group(1)))
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_blob(self, size):
+        start, end = 0, size - 1
+        rng = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if rng:
+            start = int(rng.group(1))
+            if rng.group(2): end = min(end, int(rng.group(2)))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(206 if rng else 200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", f'"blob-{size}"')
+        if rng: self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        pos, block = start, len(self.pattern)
+        try:
+            while pos <= end:
+                off = pos % block
+                n = min(block - off, end - pos + 1, 256 * 1024)
+                self.wfile.write(self.pattern[off:off + n])
+                pos += n
+        except (BrokenPipeError, ConnectionResetError): pass
+
+def build_metadata(n):
+    files = [{"name": entry_name(i), "source": "original", "size": str(entry_size(i)), "md5": f"{i:032x}",
+              "format": "ZIP", "mtime": "1600000000"} for i in range(n)]
+    doc = {"created": 1600000000, "d1": "ia800000.us.archive.org", "d2": "ia900000.us.archive.org",
+           "dir": f"/0/items/bench-{n}", "files": files, "files_count": n, "item_size": sum(entry_size(i) for i in range(n)),
+           "metadata": {"identifier": f"bench-{n}", "title": "Synthetic benchmark item", "description": "x" * 4096},
+           "server": "ia800000.us.archive.org"}
+    return json.dumps(doc).encode()
+
+def build_listing(n):
+    rows = [f'<tr><td><a href="{urllib.parse.quote(os.path.basename(entry_name(i)))}">{os.path.basename(entry_name(i))}</a></td>'
+            f'<td>01-Jan-2020 00:00</td><td>{human_size(entry_size(i))}</td></tr>' for i in range(n)]
+    head = ('<html><head><title>Index of /bench/</title></head><body><h1>Index of /bench/</h1>'
+            '<table class="directory-listing-table"><thead><tr><th><a href="?sort=name">Name</a></th>'
+            '<th><a href="?sort=date">Last modified</a></th><th><a href="?sort=size">Size</a></th></tr></thead><tbody>'
+            '<tr><td><a href="../">Go to parent directory</a></td><td></td><td></td></tr>')
+    return (head + "\n".join(rows) + "</tbody></table></body></html>").encode()
+
+def warm(scenario, arg):
+    # build response bodies up front so the server's own work is not timed
+    if scenario == "api_list": StandIn.body(StandIn, ("meta", str(arg)), lambda: build_metadata(arg))
+    elif scenario == "html_list": StandIn.body(StandIn, ("html", str(arg)), lambda: build_listing(arg))
+
+def start_server():
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+# --- CHILD SCENARIOS ---
+def rss_mb():
+    # VmHWM belongs to this process image; ru_maxrss on Linux carries over the parent's peak across fork/exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024.0
+    except OSError: pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def load_app(workdir):
+    sys.path.insert(0, HERE)
+    import ArchiveDownloader as app
+    app.CACHE_DIR = os.path.join(workdir, "cache")
+    os.makedirs(app.CACHE_DIR, exist_ok=True)
+    for name, value in (("LRU_FILE", os.path.join(app.CACHE_DIR, "lru.json")), ("LOG_FILE", os.path.join(workdir, "app.log")),
+                        ("PARTS_FILE", os.path.join(workdir, "partials.json")), ("NODES_FILE", os.path.join(workdir, "mirrors.json")),
+                        ("SYNC_FILE", os.path.join(workdir, "sync.json")), ("STORAGE_ROOT", os.path.join(workdir, "roms"))):
+        if hasattr(app, name): setattr(app, name, value)
+    return app
+
+def synthetic_items(n):
+    return [{"name": entry_name(i), "size": str(entry_size(i))} for i in range(n)]
+
+def run_api_list(app, n, server):
+    t = time.perf_counter()
+    files, err = app.fetch_api_list("bench", f"bench-{n}", "", ".zip", True)
+    return {"seconds": time.perf_counter() - t, "entries": len(files or []), "error": err}
+
+def run_html_list(app, n, server):
+    t = time.perf_counter()
+    files, err = app.fetch_html_list("bench", f"{server}/download/bench-{n}/", ".zip", True)
+    return {"seconds": time.perf_counter() - t, "entries": len(files or []), "error": err}
+
+class _Headers:
+    def getheader(self, name, default=None): return default
+
+def run_cache_load(app, n, server):
+    app.save_cache("bench", synthetic_items(n), _Headers())
+    base = rss_mb()
+    t = time.perf_counter()
+    files = app.load_cache("bench")
+    load = time.perf_counter() - t
+    t = time.perf_counter()
+    for _ in files: pass
+    return {"seconds": load, "scan_seconds": time.perf_counter() - t, "entries": len(files), "rss_delta_mb": rss_mb() - base}
+
+def run_search(app, n, server):
+    items = synthetic_items(n)
+    t = time.perf_counter()
+    index = app.SearchIndex(items)
+    index.keys  # built on first use; timed here as before
+    build = time.perf_counter() - t
+    timings = []
+    terms = [SEARCH_TERM[:k] for k in range(1, len(SEARCH_TERM) + 1)]
+    terms += terms[-2::-1]  # backspace all the way out again
+    for term in terms:
+        t = time.perf_counter()
+        index.search(term)
+        timings.append((time.perf_counter() - t) * 1000)
+    return {"build_seconds": build, "keystroke_ms_mean": sum(timings) / len(timings), "keystroke_ms_max": max(timings), "keystrokes": len(timings)}
+
+def run_render(app, n, server):
+    import curses
+    result = {}
+    def body(stdscr):
+        curses.start_color()
+        for pair, fg, bg in ((1, curses.COLOR_WHITE, curses.COLOR_BLACK), (2, curses.COLOR_BLACK, curses.COLOR_GREEN), (3, curses.COLOR_GREEN, curses.COLOR_BLACK)):
+            curses.init_pair(pair, fg, bg)
+        items = synthetic_items(n)
+        t = time.perf_counter()
+        model = app.ListModel(items)
+        result["model_seconds"] = time.perf_counter() - t
+        h, w = stdscr.getmaxyx()
+        rows = h - 4
+        t = time.perf_counter()
+        for frame in range(RENDER_FRAMES):
+            idx = (frame * 37) % n
+            start = max(0, idx - rows // 2)
+            app.draw_screen(stdscr, " ARCHIVE BROWSER | BENCH ".ljust(w), " FOOTER ", model.row, start, min(n, start + rows), idx)
+        result["frame_ms"] = (time.perf_counter() - t) * 1000 / RENDER_FRAMES
+        result["size"] = f"{w}x{h}"
+    curses.wrapper(body)
+    return result
+
+def run_download(app, size, server, segments=0):
+    t = time.perf_counter()
+    ok, msg = app.download_file(f"bench-{size}", f"blob-{size}.bin", "bench", size, None, None, segments)
+    elapsed = time.perf_counter() - t
+    dest = os.path.join(app.STORAGE_ROOT, "bench", f"blob-{size}.bin")
+    got = os.path.getsize(dest) if os.path.exists(dest) else 0
+    return {"seconds": elapsed, "mb_s": got / (1 << 20) / elapsed if elapsed else 0, "ok": ok and got == size, "msg": msg}
+
+SCENARIOS = {
+    "api_list": run_api_list,
+    "html_list": run_html_list,
+    "cache_load": run_cache_load,
+    "search": run_search,
+    "render": run_render,
+    "download": run_download,
+    "download_segmented": lambda app, size, server: run_download(app, size, server, 4)
+}
+
+def child_main(scenario, arg, server, result_path):
+    workdir = tempfile.mkdtemp(prefix="abbench-")
+    try:
+        app = load_app(workdir)
+        base = rss_mb()
+        result = SCENARIOS[scenario](app, arg, server)
+        result["rss_mb"] = rss_mb()
+        result["rss_base_mb"] = base
+    finally: shutil.rmtree(workdir, ignore_errors=True)
+    with open(result_path, "w") as f: json.dump(result, f)
+
+# --- RUNNER ---
+def run_child(scenario, arg, server, tty=False):
+    fd, result_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, str(arg), "--server", server, "--result", result_path]
+    env = dict(os.environ, ARCHIVE_URL=server)
+    try:
+        if tty:
+            # curses needs a terminal; give it an 80x30 pty like the R36S console
+            master, slave = os.openpty()
+            fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack("HHHH", 30, 80, 0, 0))
+            env["TERM"] = env.get("TERM") if env.get("TERM") not in (None, "", "dumb") else "xterm"
+            proc = subprocess.Popen(cmd, stdin=slave, stdout=slave, stderr=slave, env=env, close_fds=True)
+            os.close(slave)
+            while True:
+                try:
+                    if not os.read(master, 65536): break
+                except OSError: break
+            proc.wait()
+            os.close(master)
+        else: proc = subprocess.run(cmd, env=env)
+        if proc.returncode != 0: return {"error": f"exit {proc.returncode}"}
+        with open(result_path, "r") as f: return json.load(f)
+    finally:
+        if os.path.exists(result_path): os.remove(result_path)
+
+def plan(profile, only):
+    steps = []
+    for n in profile['lists']:
+        for scenario in ("api_list", "html_list", "cache_load", "search", "render"): steps.append((scenario, n))
+    for size in profile['downloads']:
+        steps.append(("download", size))
+        steps.append(("download_segmented", size))
+    if only: steps = [st for st in steps if st[0] in only]
+    return steps
+
+def git_rev():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError: return ""
+
+NOT_COMPARED = ("rss_base_mb", "entries", "keystrokes")
+
+def noise_floor(metric):
+    # differences this small are timer jitter, not regressions
+    if metric.endswith("_ms") or "_ms_" in metric: return 0.05
+    if "seconds" in metric: return 0.002
+    if metric.endswith("_mb"): return 1.0
+    return 0
+
+def lower_is_better(metric):
+    return not metric.endswith("mb_s")
+
+def compare(baseline, current, threshold):
+    regressions = 0
+    print(f"\n{'scenario':32} {'metric':20} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, res in sorted(current['results'].items()):
+        old = baseline['results'].get(key)
+        if not old: continue
+        for metric, value in sorted(res.items()):
+            if metric in NOT_COMPARED or not isinstance(value, (int, float)) or isinstance(value, bool): continue
+            prev = old.get(metric)
+            if not isinstance(prev, (int, float)) or not prev: continue
+            change = (value - prev) / prev * 100
+            worse = change > threshold if lower_is_better(metric) else change < -threshold
+            if worse and abs(value - prev) < noise_floor(metric): worse = False
+            regressions += worse
+            print(f"{key:32} {metric:20} {prev:12.4f} {value:12.4f} {change:+7.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="ArchiveBrowser benchmark suite")
+    ap.add_argument("--full", action="store_true", help="include 200k-entry lists and 1-2 GB downloads")
+    ap.add_argument("--only", help="comma separated scenarios: " + ",".join(SCENARIOS))
+    ap.add_argument("--out", default=os.path.join(HERE, "bench_results.json"), help="where to write results")
+    ap.add_argument("--compare", help="baseline results file to compare against")
+    ap.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    ap.add_argument("--child", nargs=2, metavar=("SCENARIO", "ARG"), help=argparse.SUPPRESS)
+    ap.add_argument("--server", help=argparse.SUPPRESS)
+    ap.add_argument("--result", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child_main(args.child[0], int(args.child[1]), args.server, args.result)
+        return 0
+
+    only = set(args.only.split(",")) if args.only else None
+    srv, server = start_server()
+    results = {}
+    try:
+        for scenario, arg in plan(FULL if args.full else QUICK, only):
+            key = f"{scenario}[{arg}]"
+            warm(scenario, arg)
+            res = run_child(scenario, arg, server, tty=(scenario == "render"))
+            results[key] = res
+            shown = ", ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in res.items())
+            print(f"{key:32} {shown}", flush=True)
+    finally: srv.shutdown()
+
+    report = {
+        "meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "git": git_rev(), "python": platform.python_version(),
+                 "machine": platform.machine(), "profile": "full" if args.full else "quick"},
+        "results": results
+    }
+    with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+    if args.compare:
+        with open(args.compare, "r") as f: baseline = json.load(f)
+        if compare(baseline, report, args.threshold): return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())